@@ -180,31 +180,35 @@ class SyncRepository(
                 val pending = db.syncQueueDao().getPendingForUser(userId, now)
                 if (pending.isEmpty()) return@withContext Result.success(0)
 
+                val opIds = pending.associate { queue -> queue.id to "q-${queue.id}-${queue.createdAtEpochMs}" }
                 val items = pending.map { queue ->
                     val payload = json.decodeFromString<JsonElement>(queue.payload)
                     SyncBatchItemDto(
                         entity_type = queue.entityType,
                         action = queue.action,
                         payload = payload,
+                        client_op_id = opIds.getValue(queue.id),
                     )
                 }
 
                 val response = api.syncBatch(SyncBatchRequestDto(items))
-                
-                // Delete successfully processed items
-                if (response.processed > 0) {
-                    pending.take(response.processed).forEach { queue ->
-                        db.syncQueueDao().deleteById(queue.id)
-                    }
-                }
 
-                // Update failed items with exponential backoff
-                if (response.failed > 0) {
-                    pending.drop(response.processed).forEachIndexed { index, queue ->
+                // Failures are reported by client_op_id and can sit anywhere in the batch.
+                // A server that reports more failures than ids predates that, so retry
+                // everything: the operation ledger turns the re-sent successes into replays.
+                val failedOpIds = if (response.failed > response.failed_op_ids.size) {
+                    opIds.values.toSet()
+                } else {
+                    response.failed_op_ids.toSet()
+                }
+                pending.forEach { queue ->
+                    if (opIds.getValue(queue.id) in failedOpIds) {
                         val newAttempts = queue.attempts + 1
                         val backoffMs = (1000L * (1L shl newAttempts.coerceAtMost(10))).coerceAtMost(24 * 60 * 60 * 1000L) // Max 24 hours
                         val nextAttempt = now + backoffMs
                         db.syncQueueDao().updateAttempt(queue.id, newAttempts, nextAttempt)
+                    } else {
+                        db.syncQueueDao().deleteById(queue.id)
                     }
                 }
 
@@ -8,6 +8,7 @@ data class SyncBatchItemDto(
     val entity_type: String,
     val action: String,
     val payload: JsonElement,
+    val client_op_id: String? = null,
 )
 
 @Serializable
@@ -19,5 +20,7 @@ data class SyncBatchRequestDto(
 data class SyncBatchResponseDto(
     val processed: Int,
     val failed: Int,
+    val replayed: Int = 0,
     val errors: List<String> = emptyList(),
+    val failed_op_ids: List<String> = emptyList(),
 )
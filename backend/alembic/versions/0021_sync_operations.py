@@ -0,0 +1,32 @@
+"""sync_operations
+
+Revision ID: 0021_sync_operations
+Revises: 0020_gigachat_settings
+Create Date: 2026-02-05
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0021_sync_operations"
+down_revision = "0020_gigachat_settings"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_operations",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("client_op_id", sa.String(length=64), primary_key=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_sync_operations_created_at", "sync_operations", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sync_operations_created_at", table_name="sync_operations")
+    op.drop_table("sync_operations")
@@ -0,0 +1,59 @@
+"""sync_changes: tombstones, book updated_at and delta indexes
+
+Revision ID: 0022_sync_changes
+Revises: 0021_sync_operations
+Create Date: 2026-02-06
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0022_sync_changes"
+down_revision = "0021_sync_operations"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "book_entries",
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute("UPDATE book_entries SET updated_at = created_at")
+
+    op.create_table(
+        "sync_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("entity_type", sa.String(length=64), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("date_epoch_day", sa.Integer(), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_sync_tombstones_user_id_deleted_at", "sync_tombstones", ["user_id", "deleted_at"])
+
+    op.create_index("ix_step_entries_user_id_updated_at", "step_entries", ["user_id", "updated_at"])
+    op.create_index("ix_weight_entries_user_id_updated_at", "weight_entries", ["user_id", "updated_at"])
+    op.create_index("ix_book_entries_user_id_updated_at", "book_entries", ["user_id", "updated_at"])
+    op.create_index("ix_water_entries_user_id_created_at", "water_entries", ["user_id", "created_at"])
+    op.create_index("ix_food_entries_user_id_created_at", "food_entries", ["user_id", "created_at"])
+    op.create_index("ix_training_entries_user_id_created_at", "training_entries", ["user_id", "created_at"])
+    op.create_index("ix_xp_events_user_id_created_at", "xp_events", ["user_id", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_xp_events_user_id_created_at", table_name="xp_events")
+    op.drop_index("ix_training_entries_user_id_created_at", table_name="training_entries")
+    op.drop_index("ix_food_entries_user_id_created_at", table_name="food_entries")
+    op.drop_index("ix_water_entries_user_id_created_at", table_name="water_entries")
+    op.drop_index("ix_book_entries_user_id_updated_at", table_name="book_entries")
+    op.drop_index("ix_weight_entries_user_id_updated_at", table_name="weight_entries")
+    op.drop_index("ix_step_entries_user_id_updated_at", table_name="step_entries")
+
+    op.drop_index("ix_sync_tombstones_user_id_deleted_at", table_name="sync_tombstones")
+    op.drop_table("sync_tombstones")
+
+    op.drop_column("book_entries", "updated_at")
@@ -0,0 +1,59 @@
+"""daily_summary rollup
+
+Revision ID: 0023_daily_summary
+Revises: 0022_sync_changes
+Create Date: 2026-02-09
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0023_daily_summary"
+down_revision = "0022_sync_changes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_summary",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("date_epoch_day", sa.Integer(), primary_key=True),
+        sa.Column("water_ml", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("kcal_in", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("kcal_burned", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("training_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("steps", sa.Integer(), nullable=True),
+        sa.Column("weight_kg", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+    op.execute(
+        """
+        INSERT INTO daily_summary (user_id, date_epoch_day, water_ml, kcal_in, kcal_burned, training_count, steps, weight_kg, updated_at)
+        SELECT user_id, date_epoch_day,
+               SUM(water_ml), SUM(kcal_in), SUM(kcal_burned), SUM(training_count),
+               MAX(steps), MAX(weight_kg), now()
+        FROM (
+            SELECT user_id, date_epoch_day, amount_ml AS water_ml, 0 AS kcal_in, 0 AS kcal_burned, 0 AS training_count,
+                   NULL::integer AS steps, NULL::double precision AS weight_kg
+            FROM water_entries
+            UNION ALL
+            SELECT user_id, date_epoch_day, 0, calories, 0, 0, NULL, NULL FROM food_entries
+            UNION ALL
+            SELECT user_id, date_epoch_day, 0, 0, calories_burned, 1, NULL, NULL FROM training_entries
+            UNION ALL
+            SELECT user_id, date_epoch_day, 0, 0, 0, 0, steps, NULL FROM step_entries
+            UNION ALL
+            SELECT user_id, date_epoch_day, 0, 0, 0, 0, NULL, weight_kg FROM weight_entries
+        ) AS entries
+        GROUP BY user_id, date_epoch_day
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_summary")
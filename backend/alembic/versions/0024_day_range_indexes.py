@@ -0,0 +1,43 @@
+"""composite (user_id, date_epoch_day) indexes for day-range reads
+
+Revision ID: 0024_day_range_indexes
+Revises: 0023_daily_summary
+Create Date: 2026-02-10
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0024_day_range_indexes"
+down_revision = "0023_daily_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Range endpoints filter on user_id = ? AND date_epoch_day BETWEEN ? AND ? and sort by created_at.
+    op.create_index(
+        "ix_water_entries_user_id_date_epoch_day", "water_entries", ["user_id", "date_epoch_day", "created_at"]
+    )
+    op.create_index(
+        "ix_food_entries_user_id_date_epoch_day", "food_entries", ["user_id", "date_epoch_day", "created_at"]
+    )
+    op.create_index(
+        "ix_training_entries_user_id_date_epoch_day", "training_entries", ["user_id", "date_epoch_day", "created_at"]
+    )
+    # /xp/me/daily sums points per day; INCLUDE lets it run as an index-only scan.
+    op.create_index(
+        "ix_xp_events_user_id_date_epoch_day",
+        "xp_events",
+        ["user_id", "date_epoch_day"],
+        postgresql_include=["points"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_xp_events_user_id_date_epoch_day", table_name="xp_events")
+    op.drop_index("ix_training_entries_user_id_date_epoch_day", table_name="training_entries")
+    op.drop_index("ix_food_entries_user_id_date_epoch_day", table_name="food_entries")
+    op.drop_index("ix_water_entries_user_id_date_epoch_day", table_name="water_entries")
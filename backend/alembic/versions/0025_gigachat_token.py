@@ -0,0 +1,32 @@
+"""shared gigachat access token
+
+Revision ID: 0025_gigachat_token
+Revises: 0024_day_range_indexes
+Create Date: 2026-02-11
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0025_gigachat_token"
+down_revision = "0024_day_range_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "gigachat_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("credentials_fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("access_token", sa.Text(), nullable=False),
+        sa.Column("expires_at_ms", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("gigachat_tokens")
@@ -0,0 +1,49 @@
+"""drop single-column indexes on per-user tables covered by composite indexes
+
+Revision ID: 0026_drop_redundant_user_indexes
+Revises: 0025_gigachat_token
+Create Date: 2026-02-12
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0026_drop_redundant_user_indexes"
+down_revision = "0025_gigachat_token"
+branch_labels = None
+depends_on = None
+
+# Every read of these tables is scoped to one user, and each table already has composite
+# indexes (or unique constraints) leading with user_id from 0022/0024. The single-column
+# ones only cost writes, and date_epoch_day/created_at alone tempt the planner into
+# scanning every user's rows for a day.
+REDUNDANT_INDEXES = [
+    ("ix_step_entries_user_id", "step_entries", "user_id"),
+    ("ix_step_entries_date_epoch_day", "step_entries", "date_epoch_day"),
+    ("ix_water_entries_user_id", "water_entries", "user_id"),
+    ("ix_water_entries_date_epoch_day", "water_entries", "date_epoch_day"),
+    ("ix_water_entries_created_at", "water_entries", "created_at"),
+    ("ix_weight_entries_user_id", "weight_entries", "user_id"),
+    ("ix_weight_entries_date_epoch_day", "weight_entries", "date_epoch_day"),
+    ("ix_food_entries_user_id", "food_entries", "user_id"),
+    ("ix_food_entries_date_epoch_day", "food_entries", "date_epoch_day"),
+    ("ix_training_entries_user_id", "training_entries", "user_id"),
+    ("ix_training_entries_date_epoch_day", "training_entries", "date_epoch_day"),
+    ("ix_book_entries_user_id", "book_entries", "user_id"),
+    ("ix_book_entries_created_at", "book_entries", "created_at"),
+    ("ix_xp_events_user_id", "xp_events", "user_id"),
+    ("ix_xp_events_date_epoch_day", "xp_events", "date_epoch_day"),
+    ("ix_xp_events_created_at", "xp_events", "created_at"),
+]
+
+
+def upgrade() -> None:
+    for name, table, _ in REDUNDANT_INDEXES:
+        op.drop_index(name, table_name=table)
+
+
+def downgrade() -> None:
+    for name, table, column in REDUNDANT_INDEXES:
+        op.create_index(name, table, [column])
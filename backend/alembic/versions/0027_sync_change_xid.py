@@ -0,0 +1,74 @@
+"""stamp synced rows with their writing transaction id
+
+Revision ID: 0027_sync_change_xid
+Revises: 0026_drop_redundant_user_indexes
+Create Date: 2026-02-13
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0027_sync_change_xid"
+down_revision = "0026_drop_redundant_user_indexes"
+branch_labels = None
+depends_on = None
+
+SYNCED_TABLES = [
+    "step_entries",
+    "water_entries",
+    "food_entries",
+    "training_entries",
+    "weight_entries",
+    "book_entries",
+    "xp_events",
+    "sync_tombstones",
+]
+
+# Only /sync/changes read these; it now filters on change_xid instead.
+SYNC_TIME_INDEXES = [
+    ("ix_step_entries_user_id_updated_at", "step_entries", "updated_at"),
+    ("ix_weight_entries_user_id_updated_at", "weight_entries", "updated_at"),
+    ("ix_book_entries_user_id_updated_at", "book_entries", "updated_at"),
+    ("ix_xp_events_user_id_created_at", "xp_events", "created_at"),
+]
+
+
+def upgrade() -> None:
+    # A trigger rather than app code, so ORM writes, bulk inserts and ON CONFLICT updates
+    # are all covered. Any transaction a reader's snapshot cannot see yet (still running,
+    # or not started) has an id >= that snapshot's xmin, so xmin is a gap-free cursor no
+    # matter how long writers take to commit or how far worker clocks drift.
+    op.execute(
+        """
+        CREATE FUNCTION stamp_change_xid() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in SYNCED_TABLES:
+        # Existing rows get 0: every cursor issued from now on is above it, and clients
+        # still on a timestamp cursor are served by the old columns once more.
+        op.add_column(table, sa.Column("change_xid", sa.BigInteger(), nullable=False, server_default="0"))
+        op.create_index(f"ix_{table}_user_id_change_xid", table, ["user_id", "change_xid"])
+        op.execute(
+            f"CREATE TRIGGER {table}_change_xid BEFORE INSERT OR UPDATE ON {table} "
+            "FOR EACH ROW EXECUTE FUNCTION stamp_change_xid()"
+        )
+    for name, table, _ in SYNC_TIME_INDEXES:
+        op.drop_index(name, table_name=table)
+
+
+def downgrade() -> None:
+    for name, table, column in SYNC_TIME_INDEXES:
+        op.create_index(name, table, ["user_id", column])
+    for table in SYNCED_TABLES:
+        op.execute(f"DROP TRIGGER {table}_change_xid ON {table}")
+        op.drop_index(f"ix_{table}_user_id_change_xid", table_name=table)
+        op.drop_column(table, "change_xid")
+    op.execute("DROP FUNCTION stamp_change_xid()")
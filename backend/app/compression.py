@@ -0,0 +1,235 @@
+"""Response compression negotiated via Accept-Encoding and transparent request decompression."""
+
+import zlib
+
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# Preferred first when the client accepts several.
+RESPONSE_ENCODINGS = ("zstd", "gzip")
+REQUEST_ENCODINGS = ("gzip", "zstd")
+
+# Already compressed, or must reach the client chunk by chunk.
+SKIP_CONTENT_TYPES = ("application/gzip", "text/event-stream", "image/")
+
+
+def accepted_encoding(accept_encoding: str) -> str | None:
+    offered = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[token.strip().lower()] = quality
+    for encoding in RESPONSE_ENCODINGS:
+        if offered.get(encoding, 0.0) > 0:
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str) -> None:
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=3).compressobj()
+            self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._flush_block = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._flush_block)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+# Compressed input fed to zstd per step. A run-length block turns a few bytes into 128 KiB,
+# so small steps keep a decompression bomb from overshooting max_size by much before the check.
+ZSTD_INPUT_STEP = 256
+
+
+def decompress_body(encoding: str, body: bytes, max_size: int) -> bytes:
+    """Inflate a request body made of one or more gzip members or zstd frames,
+    refusing to produce more than max_size bytes and rejecting a truncated last one."""
+    chunks = []
+    size = 0
+
+    def take(data: bytes) -> None:
+        nonlocal size
+        size += len(data)
+        if size > max_size:
+            raise OverflowError("Decompressed body too large")
+        chunks.append(data)
+
+    if encoding == "zstd":
+        dctx = zstandard.ZstdDecompressor()
+        frame = dctx.decompressobj()
+        in_frame = False
+        for offset in range(0, len(body), ZSTD_INPUT_STEP):
+            data = body[offset : offset + ZSTD_INPUT_STEP]
+            while data:
+                in_frame = True
+                take(frame.decompress(data))
+                if frame.eof:
+                    data = frame.unused_data
+                    frame = dctx.decompressobj()
+                    in_frame = False
+                else:
+                    data = b""
+        if in_frame:
+            raise ValueError("Truncated zstd body")
+    else:
+        data = body
+        while data:
+            inflater = zlib.decompressobj(31)
+            take(inflater.decompress(data, max_size + 1 - size))
+            if not inflater.eof:
+                raise ValueError("Truncated gzip body")
+            data = inflater.unused_data
+    return b"".join(chunks)
+
+
+class CompressionMiddleware:
+    """Compress responses of at least `minimum_size` bytes with zstd or gzip, and inflate
+    `Content-Encoding: gzip|zstd` request bodies on `decompress_paths`."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        decompress_paths: tuple[str, ...] = (),
+        max_request_size: int = 32 * 1024 * 1024,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.decompress_paths = decompress_paths
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        request_encoding = headers.get("content-encoding", "").strip().lower()
+        if request_encoding in REQUEST_ENCODINGS and scope["path"] in self.decompress_paths:
+            try:
+                scope, receive = await self.decompressed_request(scope, receive, request_encoding)
+            except OverflowError:
+                await PlainTextResponse("Request body too large", status_code=413)(scope, receive, send)
+                return
+            except (ValueError, zlib.error, zstandard.ZstdError):
+                await PlainTextResponse("Malformed compressed body", status_code=400)(scope, receive, send)
+                return
+
+        encoding = accepted_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+    async def decompressed_request(self, scope: Scope, receive: Receive, encoding: str) -> tuple[Scope, Receive]:
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ValueError("Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_request_size:
+                raise OverflowError("Compressed body too large")
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = decompress_body(encoding, b"".join(chunks), self.max_request_size)
+
+        raw_headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        scope = {**scope, "headers": raw_headers}
+
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return scope, replay
+
+
+class CompressingResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        self.compressor: StreamCompressor | None = None
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    async def send_wrapper(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or content_type.startswith(SKIP_CONTENT_TYPES)
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                # Held back until the first body chunk decides whether to compress.
+                self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compressor = StreamCompressor(self.encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # The compressed bytes differ from the identity representation, so a strong
+            # validator would no longer be true; downgrade it like nginx does.
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            if not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            await self.send(start)
+
+        data = self.compressor.compress(body)
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,33 +1,103 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+import os
+import threading
+import time
+
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import queue as sqla_queue
 
 from app.settings import settings
 
 
-class Base(DeclarativeBase):
+class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
-
-
-def get_db():
-    db = SessionLocal()
-    try:
+class PoolStats:
+    """Process-local counters for connection checkouts from the engine pool."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def record_wait(self, waited: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.checkout_timeouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+pool_stats = PoolStats()
+
+
+class MeteredQueue(sqla_queue.AsyncAdaptedQueue):
+    """Pool queue that times blocking gets, i.e. checkouts waiting for a connection to come back.
+
+    Opening a new connection and the pre-ping happen outside the queue and are not counted.
+    """
+
+    def get(self, block: bool = True, timeout: float | None = None):
+        if not block:
+            return super().get(block, timeout)
+        started = time.perf_counter()
+        try:
+            entry = super().get(block, timeout)
+        except sqla_queue.Empty:
+            pool_stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - started, timed_out=False)
+        return entry
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    _queue_class = MeteredQueue
+
+    def connect(self):
+        conn = super().connect()
+        pool_stats.record_checkout()
+        return conn
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    poolclass=MeteredQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+# Objects stay usable after commit, so handlers answer from the flushed row (ids come back
+# through INSERT ... RETURNING) instead of re-selecting it; an expired attribute could not lazy-load anyway.
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def pool_status() -> dict:
+    pool = engine.pool
+    return {
+        "pid": os.getpid(),
+        "pool_size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool starts its overflow counter at -pool_size, so it is negative until the pool fills.
+        "overflow": max(0, pool.overflow()),
+        "checkouts": pool_stats.checkouts,
+        "checkout_timeouts": pool_stats.checkout_timeouts,
+        "wait_seconds_total": round(pool_stats.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_stats.wait_seconds_max, 6),
+    }
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
-
-
-
-
-
-
-
-
-
-
-
-
-
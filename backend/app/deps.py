@@ -1,5 +1,5 @@
 from fastapi import Depends, Header, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import get_db
 from app.settings import settings
@@ -10,7 +10,7 @@ def require_admin(x_admin_key: str | None = Header(default=None)) -> None:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
-def db_dep() -> Session:
+def db_dep() -> AsyncSession:
     return Depends(get_db)  # type: ignore[return-value]
 
 
@@ -1,23 +1,36 @@
 import asyncio
 import base64
+import csv
 import datetime as dt
+import hashlib
+import io
+import json
+import os
 import time
 import uuid
-from typing import List
+import zlib
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Annotated, List
 
-from fastapi import Depends, FastAPI, Form, Header, HTTPException, Request
+from fastapi import Depends, FastAPI, Form, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.templating import Jinja2Templates
 import httpx
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import HTMLResponse, RedirectResponse
-from sqlalchemy import delete, select, update, func
+from starlette.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import bindparam, delete, insert, or_, select, text, tuple_, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.db import Base, engine, get_db
-from app.models import AdUnit, AdminUser, Family, FamilyGoal, FamilyInvite, FamilyMember, Profile, RefreshSession, User, UserSettings, StepEntry, WaterEntry, WeightEntry, SmokeStatus, FoodEntry, TrainingEntry, BookEntry, XpEvent, UserAchievement, SyncQueue, AdminSettings, Announcement
+from app.compression import CompressionMiddleware
+from app.db import Base, SessionLocal, engine, get_db, pool_status
+from app.negotiation import ApiResponse, MsgpackNegotiationMiddleware, negotiated_media_type
+from app.models import AdUnit, AdminUser, Family, FamilyGoal, FamilyInvite, FamilyMember, Profile, RefreshSession, User, UserSettings, StepEntry, WaterEntry, WeightEntry, SmokeStatus, FoodEntry, TrainingEntry, BookEntry, XpEvent, UserAchievement, SyncQueue, SyncOperation, SyncTombstone, DailySummary, AdminSettings, Announcement, GigachatToken
 from app.schemas import (
     AdUnitUpsert,
     AdsConfigResponse,
@@ -28,6 +41,7 @@ from app.schemas import (
     InviteUserRequest,
     JoinFamilyRequest,
     FamilyGoalsResponse,
+    FamilyGoalContribution,
     FamilyGoalsUpsertRequest,
     LoginRequest,
     LogoutRequest,
@@ -40,6 +54,8 @@ from app.schemas import (
     WaterCreateRequest,
     WaterEntryResponse,
     WeightEntryResponse,
+    DailySummaryResponse,
+    DashboardResponse,
     WeightUpsertRequest,
     SmokeStatusRequest,
     SmokeStatusResponse,
@@ -58,12 +74,15 @@ from app.schemas import (
     SyncBatchItem,
     SyncBatchRequest,
     SyncBatchResponse,
+    SyncChangesResponse,
+    SyncTombstoneResponse,
     AdminSettingsRequest,
     AdminSettingsResponse,
     AiChatRequest,
     AiChatResponse,
     AnnouncementReadResponse,
     AnnouncementResponse,
+    AdminAnnouncementResponse,
     AnnouncementRequest,
     PrivacyPolicyAcceptResponse,
     PrivacyPolicyResponse,
@@ -75,23 +94,181 @@ from app.schemas import (
 from app.security import (
     create_access_token,
     decode_access_token,
-    hash_password,
+    PasswordHasherBusy,
     hash_refresh_token,
     new_refresh_token,
-    verify_password,
+    password_hasher,
 )
 from app.settings import settings
 
 
-app = FastAPI(title="Alta API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    gigachat_client()
+    yield
+    await close_gigachat_client()
+    password_hasher.shutdown()
+
+
+app = FastAPI(title="Alta API", lifespan=lifespan, default_response_class=ApiResponse)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"detail": "Too many authentication requests"}, headers={"Retry-After": "1"})
 
 GIGACHAT_OAUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
 GIGACHAT_API_URL = "https://gigachat.devices.sberbank.ru/api/v1"
 
-gigachat_request_lock = asyncio.Lock()
 gigachat_token_lock = asyncio.Lock()
+# Worker-local copy of the shared gigachat_tokens row.
 gigachat_access_token: str | None = None
 gigachat_token_expires_at_ms: int = 0
+gigachat_token_fingerprint: str | None = None
+# pg_advisory_xact_lock key serialising OAuth refreshes across workers.
+GIGACHAT_TOKEN_LOCK_KEY = 0x6769676163686174
+gigachat_http: httpx.AsyncClient | None = None
+
+
+def gigachat_client() -> httpx.AsyncClient:
+    """Process-wide pooled client for the GigaChat OAuth and API hosts, opened by the lifespan.
+
+    Created lazily as well so code running outside the lifespan (scripts, a bare TestClient) still works.
+    """
+    global gigachat_http
+    if gigachat_http is None or gigachat_http.is_closed:
+        gigachat_http = httpx.AsyncClient(
+            http2=settings.GIGACHAT_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.GIGACHAT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GIGACHAT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.GIGACHAT_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.GIGACHAT_CONNECT_TIMEOUT_SECONDS,
+                read=settings.GIGACHAT_READ_TIMEOUT_SECONDS,
+                write=settings.GIGACHAT_WRITE_TIMEOUT_SECONDS,
+                pool=settings.GIGACHAT_POOL_TIMEOUT_SECONDS,
+            ),
+        )
+    return gigachat_http
+
+
+class AiDispatcher:
+    """Bounds concurrent GigaChat calls per worker.
+
+    Up to AI_MAX_CONCURRENT calls run at once and up to AI_MAX_QUEUE more wait for a
+    slot. A full queue is shed immediately with 429, and a caller that waits longer
+    than AI_QUEUE_TIMEOUT_SECONDS gets 503.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=429, detail="AI assistant is busy", headers={"Retry-After": "5"})
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await self._semaphore.acquire()
+        except TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(status_code=503, detail="AI assistant is busy", headers={"Retry-After": "5"})
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+
+ai_dispatcher = AiDispatcher(settings.AI_MAX_CONCURRENT, settings.AI_MAX_QUEUE, settings.AI_QUEUE_TIMEOUT_SECONDS)
+
+
+async def close_gigachat_client() -> None:
+    global gigachat_http
+    if gigachat_http is not None:
+        await gigachat_http.aclose()
+        gigachat_http = None
+
+
+class AdminSettingsCache:
+    """Process-local snapshot of the AdminSettings row, revalidated by its updated_at stamp.
+
+    Within ADMIN_SETTINGS_CACHE_TTL_SECONDS reads cost no query at all; after that one
+    worker-local version check picks up changes made through any other worker.
+    """
+
+    def __init__(self) -> None:
+        self._row: AdminSettings | None = None
+        self._version: dt.datetime | None = None
+        self._loaded = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self._loaded and time.monotonic() - self._checked_at < settings.ADMIN_SETTINGS_CACHE_TTL_SECONDS
+
+    def invalidate(self) -> None:
+        self._loaded = False
+
+    async def get(self, db: AsyncSession) -> AdminSettings | None:
+        if self._fresh():
+            return self._row
+        async with self._lock:
+            if self._fresh():
+                return self._row
+            if self._loaded:
+                version = (await db.execute(select(AdminSettings.updated_at))).scalar_one_or_none()
+                if version == self._version:
+                    self._checked_at = time.monotonic()
+                    return self._row
+            row = (await db.execute(select(AdminSettings))).scalar_one_or_none()
+            if row is not None:
+                # Detach so a later rollback in this request cannot expire the shared snapshot.
+                db.expunge(row)
+            self._row = row
+            self._version = row.updated_at if row is not None else None
+            self._loaded = True
+            self._checked_at = time.monotonic()
+            return row
+
+
+admin_settings_cache = AdminSettingsCache()
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -110,9 +287,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MsgpackNegotiationMiddleware, max_request_size=settings.REQUEST_MAX_BODY_BYTES)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.RESPONSE_COMPRESSION_MIN_BYTES,
+    decompress_paths=("/sync/batch", "/ai/chat", "/ai/chat/stream"),
+    max_request_size=settings.REQUEST_MAX_BODY_BYTES,
+)
+
 bearer = HTTPBearer(auto_error=False)
 
 
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Authenticated caller as far as the access token is concerned."""
+
+    id: int
+
+
+class UserLoginCache:
+    """LRU of user id -> login for recently seen users.
+
+    Logins are immutable and users are never deleted, so entries never go stale;
+    the size bound only caps memory.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, str] = OrderedDict()
+
+    def get(self, user_id: int) -> str | None:
+        login = self._entries.get(user_id)
+        if login is not None:
+            self._entries.move_to_end(user_id)
+        return login
+
+    def put(self, user_id: int, login: str) -> None:
+        self._entries[user_id] = login
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+user_login_cache = UserLoginCache(settings.AUTH_USER_CACHE_SIZE)
+
+
 def now() -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc)
 
@@ -128,44 +348,231 @@ def week_bounds(target: dt.date | None = None) -> tuple[int, int]:
     return (start_date - epoch).days, (end_date - epoch).days
 
 
+# /sync/changes refuses older cursors, so tombstones are only kept this long, plus a day
+# for deletes whose transaction was still open when such a cursor was issued.
+SYNC_CURSOR_TTL = dt.timedelta(seconds=settings.SYNC_CURSOR_TTL_SECONDS)
+SYNC_TOMBSTONE_RETENTION = SYNC_CURSOR_TTL + dt.timedelta(days=1)
+
+
+async def record_tombstones(db: AsyncSession, user_id: int, entity_type: str, deleted: list[tuple[int, int | None]]) -> None:
+    """Remember deleted rows so /sync/changes can tell clients to drop them."""
+    if not deleted:
+        return
+    deleted_at = now()
+    await db.execute(
+        delete(SyncTombstone).where(
+            SyncTombstone.user_id == user_id,
+            SyncTombstone.deleted_at < deleted_at - SYNC_TOMBSTONE_RETENTION,
+        )
+    )
+    await db.execute(
+        insert(SyncTombstone).values(
+            [
+                {
+                    "user_id": user_id,
+                    "entity_type": entity_type,
+                    "entity_id": entity_id,
+                    "date_epoch_day": date_epoch_day,
+                    "deleted_at": deleted_at,
+                }
+                for entity_id, date_epoch_day in deleted
+            ]
+        )
+    )
+
+
+# Listings are keyset-paginated newest first on (created_at, id). Without `limit` the whole
+# list is returned as before; with it, the cursor for the next page comes back in a header
+# so existing clients that expect a bare JSON array keep working.
+PAGE_MAX_LIMIT = 500
+PAGE_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_page_cursor(created_at: dt.datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def keyset_after(model, cursor: str | None) -> list:
+    """WHERE clause continuing a newest-first listing after the row encoded in `cursor`."""
+    if cursor is None:
+        return []
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, row_id = raw.rsplit("|", 1)
+        position = (dt.datetime.fromisoformat(created_at), int(row_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [tuple_(model.created_at, model.id) < tuple_(*position)]
+
+
+def fast_json(content, response: Response) -> ApiResponse:
+    """Serialise already-shaped content with orjson (or msgpack), skipping the response_model validation pass.
+
+    Headers set on the injected `response` (e.g. the page cursor) are carried over.
+    """
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return ApiResponse(content, headers=headers)
+
+
+def page_fetch_size(limit: int | None) -> int | None:
+    # One extra row tells whether another page follows.
+    return None if limit is None else limit + 1
+
+
+def page_rows(rows, limit: int | None, response: Response) -> list:
+    rows = list(rows)
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[PAGE_CURSOR_HEADER] = encode_page_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+
+# Counters are summed into daily_summary; steps and weight_kg hold the latest value of the day.
+DAILY_SUMMARY_COUNTERS = ("water_ml", "kcal_in", "kcal_burned", "training_count")
+DAILY_SUMMARY_LATEST = ("steps", "weight_kg")
+
+
+async def bump_daily_summary(db: AsyncSession, user_id: int, changes: list[tuple[int, dict]]) -> None:
+    """Fold (date_epoch_day, delta) pairs into the user's daily_summary rows in the caller's transaction."""
+    by_day: dict[int, dict] = {}
+    for day, delta in changes:
+        row = by_day.setdefault(
+            day,
+            {"user_id": user_id, "date_epoch_day": day, **dict.fromkeys(DAILY_SUMMARY_COUNTERS, 0), **dict.fromkeys(DAILY_SUMMARY_LATEST)},
+        )
+        for key, value in delta.items():
+            row[key] = row[key] + value if key in DAILY_SUMMARY_COUNTERS else value
+    if not by_day:
+        return
+    ts = now()
+    values = [{**row, "updated_at": ts} for row in by_day.values()]
+    stmt = pg_insert(DailySummary).values(values)
+    set_ = {key: getattr(DailySummary, key) + getattr(stmt.excluded, key) for key in DAILY_SUMMARY_COUNTERS}
+    set_.update({key: func.coalesce(getattr(stmt.excluded, key), getattr(DailySummary, key)) for key in DAILY_SUMMARY_LATEST})
+    set_["updated_at"] = stmt.excluded.updated_at
+    await db.execute(
+        stmt.on_conflict_do_update(index_elements=[DailySummary.user_id, DailySummary.date_epoch_day], set_=set_)
+    )
+
+
+# Config-style payloads change rarely; clients and the nginx cache revalidate with If-None-Match.
+CONFIG_CACHE_CONTROL = "public, max-age=60"
+
+
+def make_etag(*parts: object) -> str:
+    # JSON and msgpack bodies of the same data are different representations and need different validators.
+    parts = (*parts, negotiated_media_type())
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison; proxies that gzip may add the W/ prefix.
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def conditional_response(response: Response, if_none_match: str | None, etag: str) -> Response | None:
+    """Set validator headers and return a 304 response when the client copy is current."""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CONFIG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CONFIG_CACHE_CONTROL
+    return None
+
+
 def decode_base64_image(payload: str) -> bytes:
     if "," in payload and "base64" in payload:
         payload = payload.split(",", 1)[1]
     return base64.b64decode(payload)
 
 
+def gigachat_credentials_fingerprint(auth_key: str, scope: str) -> str:
+    return hashlib.sha256(f"{auth_key}\n{scope}".encode("utf-8")).hexdigest()
+
+
+def gigachat_settings_fingerprint(settings_row: AdminSettings) -> str:
+    return gigachat_credentials_fingerprint(settings_row.gigachat_auth_key, settings_row.gigachat_scope or "GIGACHAT_API_PERS")
+
+
+def gigachat_token_usable(fingerprint: str | None, expires_at_ms: int, wanted: str) -> bool:
+    return fingerprint == wanted and expires_at_ms - 60_000 > int(time.time() * 1000)
+
+
+async def request_gigachat_token(auth_key: str, scope: str) -> tuple[str, int]:
+    headers = {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "Accept": "application/json",
+        "RqUID": str(uuid.uuid4()),
+        "Authorization": f"Basic {auth_key}",
+    }
+    data = {"scope": scope}
+    response = await gigachat_client().post(GIGACHAT_OAUTH_URL, headers=headers, data=data)
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.text)
+
+    payload = response.json()
+    token = payload.get("access_token")
+    expires_at = payload.get("expires_at")
+    if not token:
+        raise HTTPException(status_code=500, detail="Failed to obtain GigaChat access token")
+    return token, int(expires_at) if expires_at else int(time.time() * 1000) + 25 * 60 * 1000
+
+
 async def get_gigachat_access_token(settings_row: AdminSettings) -> str:
+    """Return a valid token, shared by all workers through the gigachat_tokens row.
+
+    Each worker keeps a local copy; on a miss it reads the shared row, and only when
+    that is missing, expired or issued for other credentials does it take a Postgres
+    advisory lock and call OAuth, so one refresh serves the whole cluster.
+    """
     if not settings_row.gigachat_auth_key:
         raise HTTPException(status_code=400, detail="GigaChat auth key not configured")
 
+    global gigachat_access_token, gigachat_token_expires_at_ms, gigachat_token_fingerprint
     scope = settings_row.gigachat_scope or "GIGACHAT_API_PERS"
-    now_ms = int(time.time() * 1000)
+    fingerprint = gigachat_settings_fingerprint(settings_row)
+    if gigachat_access_token and gigachat_token_usable(gigachat_token_fingerprint, gigachat_token_expires_at_ms, fingerprint):
+        return gigachat_access_token
+
     async with gigachat_token_lock:
-        global gigachat_access_token, gigachat_token_expires_at_ms
-        if gigachat_access_token and gigachat_token_expires_at_ms - 60_000 > now_ms:
+        if gigachat_access_token and gigachat_token_usable(gigachat_token_fingerprint, gigachat_token_expires_at_ms, fingerprint):
             return gigachat_access_token
 
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded",
-            "Accept": "application/json",
-            "RqUID": str(uuid.uuid4()),
-            "Authorization": f"Basic {settings_row.gigachat_auth_key}",
-        }
-        data = {"scope": scope}
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(GIGACHAT_OAUTH_URL, headers=headers, data=data)
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-
-        payload = response.json()
-        token = payload.get("access_token")
-        expires_at = payload.get("expires_at")
-        if not token:
-            raise HTTPException(status_code=500, detail="Failed to obtain GigaChat access token")
+        async with SessionLocal() as db, db.begin():
+            shared = (await db.execute(select(GigachatToken).where(GigachatToken.id == 1))).scalar_one_or_none()
+            if shared is None or not gigachat_token_usable(shared.credentials_fingerprint, shared.expires_at_ms, fingerprint):
+                await db.execute(select(func.pg_advisory_xact_lock(GIGACHAT_TOKEN_LOCK_KEY)))
+                shared = (
+                    await db.execute(
+                        select(GigachatToken).where(GigachatToken.id == 1).execution_options(populate_existing=True)
+                    )
+                ).scalar_one_or_none()
+                if shared is None or not gigachat_token_usable(shared.credentials_fingerprint, shared.expires_at_ms, fingerprint):
+                    token, expires_at_ms = await request_gigachat_token(settings_row.gigachat_auth_key, scope)
+                    values = {
+                        "credentials_fingerprint": fingerprint,
+                        "access_token": token,
+                        "expires_at_ms": expires_at_ms,
+                        "updated_at": now(),
+                    }
+                    stmt = pg_insert(GigachatToken).values(id=1, **values)
+                    shared = (
+                        await db.scalars(
+                            stmt.on_conflict_do_update(index_elements=[GigachatToken.id], set_=values).returning(GigachatToken),
+                            execution_options={"populate_existing": True},
+                        )
+                    ).one()
 
-        gigachat_access_token = token
-        gigachat_token_expires_at_ms = int(expires_at) if expires_at else now_ms + 25 * 60 * 1000
-        return token
+        gigachat_access_token = shared.access_token
+        gigachat_token_expires_at_ms = shared.expires_at_ms
+        gigachat_token_fingerprint = shared.credentials_fingerprint
+        return gigachat_access_token
 
 
 async def gigachat_upload_image(token: str, content: bytes, filename: str) -> str:
@@ -175,8 +582,7 @@ async def gigachat_upload_image(token: str, content: bytes, filename: str) -> st
     }
     files = {"file": (filename, content, "image/jpeg")}
     data = {"purpose": "general"}
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(f"{GIGACHAT_API_URL}/files", headers=headers, files=files, data=data)
+    response = await gigachat_client().post(f"{GIGACHAT_API_URL}/files", headers=headers, files=files, data=data)
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
     payload = response.json()
@@ -186,14 +592,88 @@ async def gigachat_upload_image(token: str, content: bytes, filename: str) -> st
     return file_id
 
 
+class GigachatFileCache:
+    """LRU of sha256(image bytes) -> GigaChat file_id, so re-sent photos skip the upload.
+
+    Entries expire after AI_IMAGE_CACHE_TTL_SECONDS and are scoped to the credentials
+    fingerprint, since file ids only resolve for the account that uploaded them.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[str, float]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> str | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple[str, str], file_id: str) -> None:
+        self._entries[key] = (file_id, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+
+    def status(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "pid": os.getpid(),
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+gigachat_file_cache = GigachatFileCache(settings.AI_IMAGE_CACHE_SIZE, settings.AI_IMAGE_CACHE_TTL_SECONDS)
+
+
+async def gigachat_upload_image_cached(token: str, credentials_fingerprint: str, content: bytes) -> tuple[str, tuple[str, str] | None]:
+    """Upload `content` unless the account behind `token` already has it; returns the file id
+    and, when it came from the cache, the cache key to drop should GigaChat reject it."""
+    key = (credentials_fingerprint, hashlib.sha256(content).hexdigest())
+    file_id = gigachat_file_cache.get(key)
+    if file_id is not None:
+        return file_id, key
+    file_id = await gigachat_upload_image(token, content, f"food-{key[1][:16]}.jpg")
+    gigachat_file_cache.put(key, file_id)
+    return file_id, None
+
+
+@contextmanager
+def forget_cached_files_on_rejection(keys: list[tuple[str, str]]):
+    """Drop reused file ids from the cache when the call using them fails with a 4xx:
+    the file may have been deleted upstream, and the next request should upload again."""
+    try:
+        yield
+    except HTTPException as exc:
+        if 400 <= exc.status_code < 500:
+            for key in keys:
+                gigachat_file_cache.discard(key)
+        raise
+
+
 async def gigachat_chat_completion(token: str, payload: dict) -> str:
     headers = {
         "Accept": "application/json",
         "Content-Type": "application/json",
         "Authorization": f"Bearer {token}",
     }
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(f"{GIGACHAT_API_URL}/chat/completions", headers=headers, json=payload)
+    response = await gigachat_client().post(f"{GIGACHAT_API_URL}/chat/completions", headers=headers, json=payload)
     if response.status_code != 200:
         raise HTTPException(status_code=response.status_code, detail=response.text)
     data = response.json()
@@ -207,118 +687,188 @@ async def gigachat_chat_completion(token: str, payload: dict) -> str:
     return content
 
 
-def require_family_and_members(user: User, db: Session) -> tuple[Family, list[FamilyMember]]:
-    member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
-    if member is None:
-        raise HTTPException(status_code=404, detail="User is not in a family")
-    family = db.get(Family, member.family_id)
-    if family is None:
-        raise HTTPException(status_code=404, detail="Family not found")
-    db.refresh(family)
-    members = family.members
-    return family, members
+async def open_gigachat_chat_stream(token: str, payload: dict, stack: AsyncExitStack) -> httpx.Response:
+    """Start a streaming completion whose connection is released when `stack` closes."""
+    headers = {
+        "Accept": "text/event-stream",
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}",
+    }
+    response = await stack.enter_async_context(
+        gigachat_client().stream("POST", f"{GIGACHAT_API_URL}/chat/completions", headers=headers, json={**payload, "stream": True})
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=(await response.aread()).decode("utf-8", "replace"))
+    return response
 
 
-def aggregate_family_progress(members: list[FamilyMember], week_start: int, week_end: int, db: Session):
-    member_ids = [m.user_id for m in members]
-    if not member_ids:
-        return {
-            "steps": 0,
-            "trainings": 0,
-            "water": 0,
-            "per_member": {},
-        }
+async def gigachat_stream_deltas(response: httpx.Response):
+    """Yield the content deltas of a GigaChat SSE completion until its [DONE] marker."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        choices = json.loads(data).get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
 
-    steps_rows = db.execute(
-        select(StepEntry.user_id, func.sum(StepEntry.steps))
-        .where(
-            StepEntry.user_id.in_(member_ids),
-            StepEntry.date_epoch_day >= week_start,
-            StepEntry.date_epoch_day <= week_end,
-        )
-        .group_by(StepEntry.user_id)
-    ).all()
-    steps_map = {uid: steps or 0 for uid, steps in steps_rows}
 
-    trainings_rows = db.execute(
-        select(TrainingEntry.user_id, func.count())
-        .where(
-            TrainingEntry.user_id.in_(member_ids),
-            TrainingEntry.date_epoch_day >= week_start,
-            TrainingEntry.date_epoch_day <= week_end,
-        )
-        .group_by(TrainingEntry.user_id)
-    ).all()
-    trainings_map = {uid: cnt or 0 for uid, cnt in trainings_rows}
+class ReleasingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes `release` once it is done, however it ends.
 
-    water_rows = db.execute(
-        select(WaterEntry.user_id, func.sum(WaterEntry.amount_ml))
-        .where(
-            WaterEntry.user_id.in_(member_ids),
-            WaterEntry.date_epoch_day >= week_start,
-            WaterEntry.date_epoch_day <= week_end,
+    A plain generator cleanup or BackgroundTask never runs when the body is not iterated
+    (client gone, `send` failing on the start message), which would strand whatever the
+    handler acquired for the stream.
+    """
+
+    def __init__(self, content, release: AsyncExitStack, **kwargs) -> None:
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release.aclose()
+
+
+def sse_event(data, event: str | None = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def get_family_with_members(db: AsyncSession, family_id: int) -> Family | None:
+    return (
+        await db.execute(
+            select(Family)
+            .where(Family.id == family_id)
+            .options(selectinload(Family.members).selectinload(FamilyMember.user))
+            .execution_options(populate_existing=True)
         )
-        .group_by(WaterEntry.user_id)
-    ).all()
-    water_map = {uid: ml or 0 for uid, ml in water_rows}
-
-    per_member = {}
-    for m in members:
-        per_member[m.user_id] = {
-            "login": m.user.login,
-            "steps": steps_map.get(m.user_id, 0),
-            "trainings": trainings_map.get(m.user_id, 0),
-            "water": water_map.get(m.user_id, 0),
-        }
+    ).scalar_one_or_none()
 
-    total_steps = sum(v["steps"] for v in per_member.values())
-    total_trainings = sum(v["trainings"] for v in per_member.values())
-    total_water = sum(v["water"] for v in per_member.values())
+
+async def require_family(user: Principal, db: AsyncSession) -> Family:
+    family = (
+        await db.execute(
+            select(Family)
+            .join(FamilyMember, FamilyMember.family_id == Family.id)
+            .where(FamilyMember.user_id == user.id)
+        )
+    ).scalar_one_or_none()
+    if family is None:
+        raise HTTPException(status_code=404, detail="User is not in a family")
+    return family
+
+
+async def aggregate_family_progress(family_id: int, week_start: int, week_end: int, db: AsyncSession):
+    """Weekly steps/trainings/water per family member, read from the daily_summary rollup in one statement."""
+    rows = (await db.execute(
+        select(
+            User.id,
+            User.login,
+            func.coalesce(func.sum(DailySummary.steps), 0),
+            func.coalesce(func.sum(DailySummary.training_count), 0),
+            func.coalesce(func.sum(DailySummary.water_ml), 0),
+        )
+        .select_from(FamilyMember)
+        .join(User, User.id == FamilyMember.user_id)
+        .outerjoin(
+            DailySummary,
+            (DailySummary.user_id == FamilyMember.user_id)
+            & (DailySummary.date_epoch_day >= week_start)
+            & (DailySummary.date_epoch_day <= week_end),
+        )
+        .where(FamilyMember.family_id == family_id)
+        .group_by(User.id, User.login, FamilyMember.joined_at)
+        .order_by(FamilyMember.joined_at, User.id)
+    )).all()
+
+    per_member = {
+        uid: {"login": login, "steps": int(steps), "trainings": int(trainings), "water": int(water)}
+        for uid, login, steps, trainings, water in rows
+    }
 
     return {
-        "steps": total_steps,
-        "trainings": total_trainings,
-        "water": total_water,
+        "steps": sum(v["steps"] for v in per_member.values()),
+        "trainings": sum(v["trainings"] for v in per_member.values()),
+        "water": sum(v["water"] for v in per_member.values()),
         "per_member": per_member,
     }
 
 
-def require_user(
-    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
-    db: Session = Depends(get_db),
-) -> User:
+def access_token_user_id(creds: HTTPAuthorizationCredentials | None) -> int:
     if creds is None:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
         payload = decode_access_token(creds.credentials)
-        user_id = int(payload["sub"])
+        return int(payload["sub"])
     except Exception:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    user = db.get(User, user_id)
+
+
+async def require_user(
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    user_id = access_token_user_id(creds)
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="Unauthorized")
+    user_login_cache.put(user.id, user.login)
     return user
 
 
+async def require_principal(
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
+    db: AsyncSession = Depends(get_db),
+) -> Principal:
+    """Caller identity for endpoints that only need the user id.
+
+    With AUTH_STATELESS_ACCESS the signed claims are trusted for the access-token
+    lifetime and no query is issued; otherwise the User row is checked as before.
+    """
+    user_id = access_token_user_id(creds)
+    if settings.AUTH_STATELESS_ACCESS:
+        return Principal(id=user_id)
+    user = await require_user(creds, db)
+    return Principal(id=user.id)
+
+
+async def get_user_login(principal: Principal, db: AsyncSession) -> str:
+    login = user_login_cache.get(principal.id)
+    if login is not None:
+        return login
+    user = await db.get(User, principal.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    user_login_cache.put(user.id, user.login)
+    return user.login
+
+
 def require_admin(x_admin_key: str | None) -> None:
     if not x_admin_key or x_admin_key != settings.ADMIN_API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
 
-def require_admin_session(request: Request, db: Session) -> AdminUser:
+async def require_admin_session(request: Request, db: AsyncSession) -> AdminUser:
     admin_user_id = request.session.get("admin_user_id")
     if not admin_user_id:
         raise HTTPException(status_code=303, headers={"Location": "/admin/login"})
-    admin_user = db.get(AdminUser, int(admin_user_id))
+    admin_user = await db.get(AdminUser, int(admin_user_id))
     if admin_user is None:
         request.session.clear()
         raise HTTPException(status_code=303, headers={"Location": "/admin/login"})
     return admin_user
 
 
-def admin_guard(request: Request, db: Session) -> AdminUser | RedirectResponse:
+async def admin_guard(request: Request, db: AsyncSession) -> AdminUser | RedirectResponse:
     try:
-        return require_admin_session(request, db)
+        return await require_admin_session(request, db)
     except HTTPException as e:
         if e.status_code == 303:
             return RedirectResponse(url=e.headers["Location"], status_code=303)
@@ -326,15 +876,15 @@ def admin_guard(request: Request, db: Session) -> AdminUser | RedirectResponse:
 
 
 @app.get("/admin", response_class=HTMLResponse)
-def admin_root(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_root(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     return RedirectResponse(url="/admin/users", status_code=303)
 
 
 @app.get("/admin/login", response_class=HTMLResponse)
-def admin_login_get(request: Request):
+async def admin_login_get(request: Request):
     return templates.TemplateResponse(
         "login.html",
         {"request": request, "title": "Admin • Login", "error": None},
@@ -342,14 +892,14 @@ def admin_login_get(request: Request):
 
 
 @app.post("/admin/login")
-def admin_login_post(
+async def admin_login_post(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    admin_user = db.execute(select(AdminUser).where(AdminUser.username == username)).scalar_one_or_none()
-    if admin_user is None or not verify_password(password, admin_user.password_hash):
+    admin_user = (await db.execute(select(AdminUser).where(AdminUser.username == username))).scalar_one_or_none()
+    if admin_user is None or not await password_hasher.verify(password, admin_user.password_hash):
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "title": "Admin • Login", "error": "Неверный логин или пароль"},
@@ -360,7 +910,7 @@ def admin_login_post(
 
 
 @app.get("/admin/register", response_class=HTMLResponse)
-def admin_register_get(request: Request):
+async def admin_register_get(request: Request):
     return templates.TemplateResponse(
         "register.html",
         {"request": request, "title": "Admin • Register", "error": None},
@@ -368,13 +918,13 @@ def admin_register_get(request: Request):
 
 
 @app.post("/admin/register")
-def admin_register_post(
+async def admin_register_post(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    any_admin = db.execute(select(AdminUser.id).limit(1)).first() is not None
+    any_admin = (await db.execute(select(AdminUser.id).limit(1))).first() is not None
     if any_admin:
         return templates.TemplateResponse(
             "register.html",
@@ -385,30 +935,29 @@ def admin_register_post(
             },
             status_code=403,
         )
-    existing = db.execute(select(AdminUser).where(AdminUser.username == username)).scalar_one_or_none()
+    existing = (await db.execute(select(AdminUser).where(AdminUser.username == username))).scalar_one_or_none()
     if existing is not None:
         return templates.TemplateResponse(
             "register.html",
             {"request": request, "title": "Admin • Register", "error": "Пользователь уже существует"},
             status_code=400,
         )
-    admin_user = AdminUser(username=username, password_hash=hash_password(password), created_at=now())
+    admin_user = AdminUser(username=username, password_hash=await password_hasher.hash(password), created_at=now())
     db.add(admin_user)
-    db.commit()
-    db.refresh(admin_user)
+    await db.commit()
     request.session["admin_user_id"] = admin_user.id
     return RedirectResponse(url="/admin/users", status_code=303)
 
 
 @app.post("/admin/logout")
-def admin_logout(request: Request):
+async def admin_logout(request: Request):
     request.session.clear()
     return RedirectResponse(url="/admin/integration", status_code=303)
 
 
 @app.get("/admin/settings", response_class=HTMLResponse)
-def admin_settings_page(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_settings_page(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     admin_user = guard
@@ -423,8 +972,8 @@ def admin_settings_page(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/admin/gigachat", response_class=HTMLResponse)
-def admin_gigachat_page(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_gigachat_page(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     admin_user = guard
@@ -439,21 +988,21 @@ def admin_gigachat_page(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/admin/users", response_class=HTMLResponse)
-def admin_users(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_users(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     admin_user = guard
 
-    users = db.execute(select(User).order_by(User.id.desc())).scalars().all()
-    profiles = {p.user_id: p for p in db.execute(select(Profile)).scalars().all()}
-    settings_map = {s.user_id: s for s in db.execute(select(UserSettings)).scalars().all()}
+    users = (await db.execute(select(User).order_by(User.id.desc()))).scalars().all()
+    profiles = {p.user_id: p for p in (await db.execute(select(Profile))).scalars().all()}
+    settings_map = {s.user_id: s for s in (await db.execute(select(UserSettings))).scalars().all()}
 
     family_name_by_user: dict[int, str] = {}
-    members = db.execute(select(FamilyMember)).scalars().all()
+    members = (await db.execute(select(FamilyMember))).scalars().all()
     if members:
         family_ids = {m.family_id for m in members}
-        families = {f.id: f for f in db.execute(select(Family).where(Family.id.in_(family_ids))).scalars().all()}
+        families = {f.id: f for f in (await db.execute(select(Family).where(Family.id.in_(family_ids)))).scalars().all()}
         for m in members:
             fam = families.get(m.family_id)
             if fam is not None:
@@ -482,13 +1031,13 @@ def admin_users(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/admin/ads", response_class=HTMLResponse)
-def admin_ads(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_ads(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     admin_user = guard
-    ads = db.execute(select(AdUnit).order_by(AdUnit.network.asc(), AdUnit.placement.asc())).scalars().all()
-    settings_row = db.execute(select(AdminSettings)).scalar_one_or_none()
+    ads = (await db.execute(select(AdUnit).order_by(AdUnit.network.asc(), AdUnit.placement.asc()))).scalars().all()
+    settings_row = (await db.execute(select(AdminSettings))).scalar_one_or_none()
     return templates.TemplateResponse(
         "ads.html",
         {
@@ -502,16 +1051,16 @@ def admin_ads(request: Request, db: Session = Depends(get_db)):
 
 
 @app.post("/admin/ads/appodeal")
-def admin_ads_appodeal(
+async def admin_ads_appodeal(
     request: Request,
     appodeal_app_key: str | None = Form(default=None),
     appodeal_enabled: str | None = Form(default=None),
     appodeal_banner_enabled: str | None = Form(default=None),
     appodeal_interstitial_enabled: str | None = Form(default=None),
     appodeal_rewarded_enabled: str | None = Form(default=None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    guard = admin_guard(request, db)
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
 
@@ -520,7 +1069,7 @@ def admin_ads_appodeal(
     inter_bool = appodeal_interstitial_enabled == "on"
     rewarded_bool = appodeal_rewarded_enabled == "on"
 
-    row = db.execute(select(AdminSettings)).scalar_one_or_none()
+    row = (await db.execute(select(AdminSettings))).scalar_one_or_none()
     if row is None:
         row = AdminSettings(
             openrouter_api_key=None,
@@ -541,12 +1090,13 @@ def admin_ads_appodeal(
         row.appodeal_rewarded_enabled = rewarded_bool
         row.updated_at = now()
 
-    db.commit()
+    await db.commit()
+    admin_settings_cache.invalidate()
     return RedirectResponse(url="/admin/ads", status_code=303)
 
 
 @app.post("/admin/ads/upsert")
-def admin_ads_upsert(
+async def admin_ads_upsert(
     request: Request,
     id: int | None = Form(default=None),
     network: str = Form(...),
@@ -555,9 +1105,9 @@ def admin_ads_upsert(
     enabled: str | None = Form(default=None),
     android_min_version: str | None = Form(default=None),
     android_max_version: str | None = Form(default=None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    guard = admin_guard(request, db)
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
 
@@ -566,7 +1116,7 @@ def admin_ads_upsert(
     max_v = int(android_max_version) if android_max_version else None
 
     if id:
-        item = db.get(AdUnit, int(id))
+        item = await db.get(AdUnit, int(id))
         if item is None:
             raise HTTPException(status_code=404, detail="Not found")
         item.network = network
@@ -576,17 +1126,17 @@ def admin_ads_upsert(
         item.android_min_version = min_v
         item.android_max_version = max_v
         item.updated_at = now()
-        db.commit()
+        await db.commit()
         return RedirectResponse(url="/admin/ads", status_code=303)
 
-    existing = db.execute(select(AdUnit).where(AdUnit.network == network, AdUnit.placement == placement)).scalar_one_or_none()
+    existing = (await db.execute(select(AdUnit).where(AdUnit.network == network, AdUnit.placement == placement))).scalar_one_or_none()
     if existing is not None:
         existing.ad_unit_id = ad_unit_id
         existing.enabled = enabled_bool
         existing.android_min_version = min_v
         existing.android_max_version = max_v
         existing.updated_at = now()
-        db.commit()
+        await db.commit()
         return RedirectResponse(url="/admin/ads", status_code=303)
 
     item = AdUnit(
@@ -600,33 +1150,33 @@ def admin_ads_upsert(
         updated_at=now(),
     )
     db.add(item)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/admin/ads", status_code=303)
 
 
 @app.post("/admin/ads/delete")
-def admin_ads_delete(
+async def admin_ads_delete(
     request: Request,
     id: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    guard = admin_guard(request, db)
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
-    item = db.get(AdUnit, int(id))
+    item = await db.get(AdUnit, int(id))
     if item is not None:
-        db.delete(item)
-        db.commit()
+        await db.delete(item)
+        await db.commit()
     return RedirectResponse(url="/admin/ads", status_code=303)
 
 
 @app.get("/admin/integration", response_class=HTMLResponse)
-def admin_integration(request: Request, db: Session = Depends(get_db)):
-    guard = admin_guard(request, db)
+async def admin_integration(request: Request, db: AsyncSession = Depends(get_db)):
+    guard = await admin_guard(request, db)
     if isinstance(guard, RedirectResponse):
         return guard
     admin_user = guard
-    ads = db.execute(select(AdUnit).where(AdUnit.enabled == True)).scalars().all()  # noqa: E712
+    ads = (await db.execute(select(AdUnit).where(AdUnit.enabled == True))).scalars().all()  # noqa: E712
     placements = {a.placement: a.ad_unit_id for a in ads}
     return templates.TemplateResponse(
         "integration.html",
@@ -640,22 +1190,39 @@ def admin_integration(request: Request, db: Session = Depends(get_db)):
 
 
 @app.get("/health")
-def health() -> dict[str, str]:
+async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/internal/db/pool")
+async def internal_db_pool(x_admin_key: str | None = Header(default=None, alias="X-Admin-Key")) -> dict:
+    require_admin(x_admin_key)
+    return pool_status()
+
+
+@app.get("/internal/ai/dispatch")
+async def internal_ai_dispatch(x_admin_key: str | None = Header(default=None, alias="X-Admin-Key")) -> dict:
+    require_admin(x_admin_key)
+    return ai_dispatcher.status()
+
+
+@app.get("/internal/ai/image-cache")
+async def internal_ai_image_cache(x_admin_key: str | None = Header(default=None, alias="X-Admin-Key")) -> dict:
+    require_admin(x_admin_key)
+    return gigachat_file_cache.status()
+
+
 @app.post("/auth/register", response_model=UserMeResponse)
-def register(req: RegisterRequest, db: Session = Depends(get_db)) -> UserMeResponse:
+async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db)) -> UserMeResponse:
     try:
-        existing = db.execute(select(User).where(User.login == req.login)).scalar_one_or_none()
+        existing = (await db.execute(select(User).where(User.login == req.login))).scalar_one_or_none()
         if existing is not None:
             raise HTTPException(status_code=409, detail="Login already exists")
-        user = User(login=req.login, password_hash=hash_password(req.password))
+        user = User(login=req.login, password_hash=await password_hasher.hash(req.password))
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
         return UserMeResponse(id=user.id, login=user.login)
-    except HTTPException:
+    except (HTTPException, PasswordHasherBusy):
         raise
     except Exception as e:
         import traceback
@@ -664,9 +1231,9 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)) -> UserMeRespo
 
 
 @app.post("/auth/login", response_model=TokenPair)
-def login(req: LoginRequest, db: Session = Depends(get_db)) -> TokenPair:
-    user = db.execute(select(User).where(User.login == req.login)).scalar_one_or_none()
-    if user is None or not verify_password(req.password, user.password_hash):
+async def login(req: LoginRequest, db: AsyncSession = Depends(get_db)) -> TokenPair:
+    user = (await db.execute(select(User).where(User.login == req.login))).scalar_one_or_none()
+    if user is None or not await password_hasher.verify(req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     refresh_token = new_refresh_token()
@@ -681,15 +1248,16 @@ def login(req: LoginRequest, db: Session = Depends(get_db)) -> TokenPair:
         last_used_at=now(),
     )
     db.add(session)
-    db.commit()
+    await db.commit()
+    user_login_cache.put(user.id, user.login)
 
     return TokenPair(access_token=create_access_token(user.id), refresh_token=refresh_token)
 
 
 @app.post("/auth/refresh", response_model=TokenPair)
-def refresh(req: RefreshRequest, db: Session = Depends(get_db)) -> TokenPair:
+async def refresh(req: RefreshRequest, db: AsyncSession = Depends(get_db)) -> TokenPair:
     token_hash = hash_refresh_token(req.refresh_token)
-    session = db.execute(select(RefreshSession).where(RefreshSession.refresh_hash == token_hash)).scalar_one_or_none()
+    session = (await db.execute(select(RefreshSession).where(RefreshSession.refresh_hash == token_hash))).scalar_one_or_none()
     if session is None:
         raise HTTPException(status_code=401, detail="Invalid refresh")
     if session.revoked_at is not None:
@@ -699,7 +1267,7 @@ def refresh(req: RefreshRequest, db: Session = Depends(get_db)) -> TokenPair:
     if req.device_id and session.device_id and req.device_id != session.device_id:
         raise HTTPException(status_code=401, detail="Invalid refresh")
 
-    user = db.get(User, session.user_id)
+    user = await db.get(User, session.user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="Invalid refresh")
 
@@ -718,39 +1286,42 @@ def refresh(req: RefreshRequest, db: Session = Depends(get_db)) -> TokenPair:
         last_used_at=now(),
     )
     db.add(new_session)
-    db.commit()
+    await db.commit()
+    user_login_cache.put(user.id, user.login)
 
     return TokenPair(access_token=create_access_token(user.id), refresh_token=new_token)
 
 
 @app.post("/auth/logout")
-def logout(req: LogoutRequest, db: Session = Depends(get_db)) -> dict[str, str]:
+async def logout(req: LogoutRequest, db: AsyncSession = Depends(get_db)) -> dict[str, str]:
     token_hash = hash_refresh_token(req.refresh_token)
-    session = db.execute(select(RefreshSession).where(RefreshSession.refresh_hash == token_hash)).scalar_one_or_none()
+    session = (await db.execute(select(RefreshSession).where(RefreshSession.refresh_hash == token_hash))).scalar_one_or_none()
     if session is not None and session.revoked_at is None:
         session.revoked_at = now()
         session.last_used_at = now()
-        db.commit()
+        await db.commit()
     return {"status": "ok"}
 
 
 @app.get("/users/me", response_model=UserMeResponse)
-def me(user: User = Depends(require_user)) -> UserMeResponse:
-    return UserMeResponse(id=user.id, login=user.login)
+async def me(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> UserMeResponse:
+    return UserMeResponse(id=user.id, login=await get_user_login(user, db))
 
 
 @app.get("/ads/config", response_model=AdsConfigResponse)
-def ads_config(
+async def ads_config(
+    response: Response,
     platform: str = "android",
     appVersion: int = 1,
     network: str = "yandex",
-    db: Session = Depends(get_db),
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
 ) -> AdsConfigResponse:
     # platform reserved for future use
     _ = platform
 
     q = select(AdUnit).where(AdUnit.network == network, AdUnit.enabled == True)  # noqa: E712
-    units = db.execute(q).scalars().all()
+    units = (await db.execute(q)).scalars().all()
     filtered = []
     for u in units:
         if u.android_min_version is not None and appVersion < u.android_min_version:
@@ -759,7 +1330,15 @@ def ads_config(
             continue
         filtered.append(u)
 
-    settings_row = db.execute(select(AdminSettings)).scalar_one_or_none()
+    settings_row = await admin_settings_cache.get(db)
+    etag = make_etag(
+        network,
+        settings_row.updated_at.isoformat() if settings_row is not None else None,
+        *(f"{u.id}:{u.updated_at.isoformat()}" for u in sorted(filtered, key=lambda u: u.id)),
+    )
+    not_modified = conditional_response(response, if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
     return AdsConfigResponse(
         network=network,
         units={u.placement: u.ad_unit_id for u in filtered},
@@ -772,8 +1351,8 @@ def ads_config(
 
 
 @app.get("/profile/me", response_model=ProfileResponse)
-def get_profile(user: User = Depends(require_user), db: Session = Depends(get_db)) -> ProfileResponse:
-    profile = db.execute(select(Profile).where(Profile.user_id == user.id)).scalar_one_or_none()
+async def get_profile(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> ProfileResponse:
+    profile = (await db.execute(select(Profile).where(Profile.user_id == user.id))).scalar_one_or_none()
     if profile is None:
         raise HTTPException(status_code=404, detail="Profile not found")
     return ProfileResponse(
@@ -789,27 +1368,16 @@ def get_profile(user: User = Depends(require_user), db: Session = Depends(get_db
 
 
 @app.put("/profile/me", response_model=ProfileResponse)
-def upsert_profile(req: ProfileRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> ProfileResponse:
-    profile = db.execute(select(Profile).where(Profile.user_id == user.id)).scalar_one_or_none()
-    if profile is None:
-        profile = Profile(
-            user_id=user.id,
-            height_cm=req.height_cm,
-            weight_kg=req.weight_kg,
-            age=req.age,
-            sex=req.sex,
-            created_at=now(),
-            updated_at=now(),
+async def upsert_profile(req: ProfileRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> ProfileResponse:
+    fields = {"height_cm": req.height_cm, "weight_kg": req.weight_kg, "age": req.age, "sex": req.sex, "updated_at": now()}
+    stmt = pg_insert(Profile).values(user_id=user.id, created_at=fields["updated_at"], **fields)
+    profile = (
+        await db.scalars(
+            stmt.on_conflict_do_update(index_elements=[Profile.user_id], set_=fields).returning(Profile),
+            execution_options={"populate_existing": True},
         )
-        db.add(profile)
-    else:
-        profile.height_cm = req.height_cm
-        profile.weight_kg = req.weight_kg
-        profile.age = req.age
-        profile.sex = req.sex
-        profile.updated_at = now()
-    db.commit()
-    db.refresh(profile)
+    ).one()
+    await db.commit()
     return ProfileResponse(
         id=profile.id,
         user_id=profile.user_id,
@@ -823,15 +1391,15 @@ def upsert_profile(req: ProfileRequest, user: User = Depends(require_user), db:
 
 
 @app.post("/admin/ad_units/upsert")
-def admin_upsert_ad_unit(
+async def admin_upsert_ad_unit(
     req: AdUnitUpsert,
     x_admin_key: str | None = Header(default=None, alias="X-Admin-Key"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
     require_admin(x_admin_key)
-    existing = db.execute(
+    existing = (await db.execute(
         select(AdUnit).where(AdUnit.network == req.network, AdUnit.placement == req.placement)
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     if existing is None:
         item = AdUnit(
             network=req.network,
@@ -844,7 +1412,7 @@ def admin_upsert_ad_unit(
             updated_at=now(),
         )
         db.add(item)
-        db.commit()
+        await db.commit()
         return {"status": "created"}
 
     existing.ad_unit_id = req.ad_unit_id
@@ -852,13 +1420,13 @@ def admin_upsert_ad_unit(
     existing.android_min_version = req.android_min_version
     existing.android_max_version = req.android_max_version
     existing.updated_at = now()
-    db.commit()
+    await db.commit()
     return {"status": "updated"}
 
 
 @app.get("/user_settings/me", response_model=UserSettingsResponse)
-def get_user_settings(user: User = Depends(require_user), db: Session = Depends(get_db)) -> UserSettingsResponse:
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one_or_none()
+async def get_user_settings(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> UserSettingsResponse:
+    user_settings = (await db.execute(select(UserSettings).where(UserSettings.user_id == user.id))).scalar_one_or_none()
     if user_settings is None:
         raise HTTPException(status_code=404, detail="User settings not found")
     return UserSettingsResponse(
@@ -878,28 +1446,23 @@ def get_user_settings(user: User = Depends(require_user), db: Session = Depends(
 
 
 @app.put("/user_settings/me", response_model=UserSettingsResponse)
-def upsert_user_settings(req: UserSettingsRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> UserSettingsResponse:
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one_or_none()
-    if user_settings is None:
-        user_settings = UserSettings(
-            user_id=user.id,
-            calorie_mode=req.calorie_mode,
-            step_goal=req.step_goal,
-            calorie_goal_override=req.calorie_goal_override,
-            target_weight_kg=req.target_weight_kg,
-            reminders_enabled=req.reminders_enabled,
-            updated_at=now(),
+async def upsert_user_settings(req: UserSettingsRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> UserSettingsResponse:
+    fields = {
+        "calorie_mode": req.calorie_mode,
+        "step_goal": req.step_goal,
+        "calorie_goal_override": req.calorie_goal_override,
+        "target_weight_kg": req.target_weight_kg,
+        "reminders_enabled": req.reminders_enabled,
+        "updated_at": now(),
+    }
+    stmt = pg_insert(UserSettings).values(user_id=user.id, **fields)
+    user_settings = (
+        await db.scalars(
+            stmt.on_conflict_do_update(index_elements=[UserSettings.user_id], set_=fields).returning(UserSettings),
+            execution_options={"populate_existing": True},
         )
-        db.add(user_settings)
-    else:
-        user_settings.calorie_mode = req.calorie_mode
-        user_settings.step_goal = req.step_goal
-        user_settings.calorie_goal_override = req.calorie_goal_override
-        user_settings.target_weight_kg = req.target_weight_kg
-        user_settings.reminders_enabled = req.reminders_enabled
-        user_settings.updated_at = now()
-    db.commit()
-    db.refresh(user_settings)
+    ).one()
+    await db.commit()
     return UserSettingsResponse(
         id=user_settings.id,
         user_id=user_settings.user_id,
@@ -915,20 +1478,28 @@ def upsert_user_settings(req: UserSettingsRequest, user: User = Depends(require_
 
 
 @app.get("/privacy_policy", response_model=PrivacyPolicyResponse)
-def get_privacy_policy(db: Session = Depends(get_db)) -> PrivacyPolicyResponse:
-    row = db.execute(select(AdminSettings)).scalar_one_or_none()
+async def get_privacy_policy(
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+) -> PrivacyPolicyResponse:
+    row = await admin_settings_cache.get(db)
     if row is None or not row.privacy_policy_text or not row.privacy_policy_updated_at:
         raise HTTPException(status_code=404, detail="Privacy policy not configured")
+    etag = make_etag("privacy_policy", row.privacy_policy_updated_at.isoformat(), row.updated_at.isoformat())
+    not_modified = conditional_response(response, if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
     return PrivacyPolicyResponse(text=row.privacy_policy_text, updated_at=row.privacy_policy_updated_at.isoformat())
 
 
 @app.post("/privacy_policy/accept", response_model=PrivacyPolicyAcceptResponse)
-def accept_privacy_policy(user: User = Depends(require_user), db: Session = Depends(get_db)) -> PrivacyPolicyAcceptResponse:
-    policy = db.execute(select(AdminSettings)).scalar_one_or_none()
+async def accept_privacy_policy(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> PrivacyPolicyAcceptResponse:
+    policy = await admin_settings_cache.get(db)
     if policy is None or not policy.privacy_policy_updated_at:
         raise HTTPException(status_code=404, detail="Privacy policy not configured")
 
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one_or_none()
+    user_settings = (await db.execute(select(UserSettings).where(UserSettings.user_id == user.id))).scalar_one_or_none()
     if user_settings is None:
         raise HTTPException(status_code=404, detail="User settings not found")
 
@@ -936,7 +1507,7 @@ def accept_privacy_policy(user: User = Depends(require_user), db: Session = Depe
     user_settings.privacy_policy_accepted_at = accepted_at
     user_settings.privacy_policy_accepted_policy_updated_at = policy.privacy_policy_updated_at
     user_settings.updated_at = now()
-    db.commit()
+    await db.commit()
     return PrivacyPolicyAcceptResponse(
         accepted_at=accepted_at.isoformat(),
         policy_updated_at=policy.privacy_policy_updated_at.isoformat(),
@@ -944,8 +1515,12 @@ def accept_privacy_policy(user: User = Depends(require_user), db: Session = Depe
 
 
 @app.get("/announcement", response_model=AnnouncementResponse)
-def get_announcement(db: Session = Depends(get_db)) -> AnnouncementResponse:
-    row = db.execute(select(AdminSettings)).scalar_one_or_none()
+async def get_announcement(
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+) -> AnnouncementResponse:
+    row = await admin_settings_cache.get(db)
     if (
         row is None
         or not row.announcement_enabled
@@ -954,6 +1529,11 @@ def get_announcement(db: Session = Depends(get_db)) -> AnnouncementResponse:
     ):
         raise HTTPException(status_code=404, detail="Announcement not configured")
 
+    # Button fields are edited without bumping announcement_updated_at, so the row version is part of the tag.
+    etag = make_etag("announcement", row.announcement_updated_at.isoformat(), row.updated_at.isoformat())
+    not_modified = conditional_response(response, if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
     return AnnouncementResponse(
         text=row.announcement_text,
         updated_at=row.announcement_updated_at.isoformat(),
@@ -964,12 +1544,12 @@ def get_announcement(db: Session = Depends(get_db)) -> AnnouncementResponse:
 
 
 @app.post("/announcement/read", response_model=AnnouncementReadResponse)
-def read_announcement(user: User = Depends(require_user), db: Session = Depends(get_db)) -> AnnouncementReadResponse:
-    announcement = db.execute(select(AdminSettings)).scalar_one_or_none()
+async def read_announcement(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> AnnouncementReadResponse:
+    announcement = await admin_settings_cache.get(db)
     if announcement is None or not announcement.announcement_updated_at:
         raise HTTPException(status_code=404, detail="Announcement not configured")
 
-    user_settings = db.execute(select(UserSettings).where(UserSettings.user_id == user.id)).scalar_one_or_none()
+    user_settings = (await db.execute(select(UserSettings).where(UserSettings.user_id == user.id))).scalar_one_or_none()
     if user_settings is None:
         raise HTTPException(status_code=404, detail="User settings not found")
 
@@ -977,7 +1557,7 @@ def read_announcement(user: User = Depends(require_user), db: Session = Depends(
     user_settings.announcement_read_at = read_at
     user_settings.announcement_read_announcement_updated_at = announcement.announcement_updated_at
     user_settings.updated_at = now()
-    db.commit()
+    await db.commit()
 
     return AnnouncementReadResponse(
         read_at=read_at.isoformat(),
@@ -986,11 +1566,22 @@ def read_announcement(user: User = Depends(require_user), db: Session = Depends(
 
 
 # Admin announcements (news) management
-@app.get("/admin/announcements", response_model=List[AnnouncementResponse])
-def list_announcements(db: Session = Depends(get_db)) -> List[AnnouncementResponse]:
-    rows = db.execute(select(Announcement).order_by(Announcement.created_at.desc())).scalars().all()
+@app.get("/admin/announcements", response_model=List[AdminAnnouncementResponse])
+async def list_announcements(
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
+) -> List[AdminAnnouncementResponse]:
+    rows = (await db.execute(
+        select(Announcement)
+        .where(*keyset_after(Announcement, cursor))
+        .order_by(Announcement.created_at.desc(), Announcement.id.desc())
+        .limit(page_fetch_size(limit))
+    )).scalars().all()
+    rows = page_rows(rows, limit, response)
     return [
-        AnnouncementResponse(
+        AdminAnnouncementResponse(
             id=row.id,
             title=row.title,
             text=row.text,
@@ -1005,8 +1596,8 @@ def list_announcements(db: Session = Depends(get_db)) -> List[AnnouncementRespon
     ]
 
 
-@app.post("/admin/announcements", response_model=AnnouncementResponse)
-def create_announcement(req: AnnouncementRequest, db: Session = Depends(get_db)) -> AnnouncementResponse:
+@app.post("/admin/announcements", response_model=AdminAnnouncementResponse)
+async def create_announcement(req: AnnouncementRequest, db: AsyncSession = Depends(get_db)) -> AdminAnnouncementResponse:
     row = Announcement(
         title=req.title,
         text=req.text,
@@ -1018,9 +1609,8 @@ def create_announcement(req: AnnouncementRequest, db: Session = Depends(get_db))
         updated_at=now(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
-    return AnnouncementResponse(
+    await db.commit()
+    return AdminAnnouncementResponse(
         id=row.id,
         title=row.title,
         text=row.text,
@@ -1033,9 +1623,9 @@ def create_announcement(req: AnnouncementRequest, db: Session = Depends(get_db))
     )
 
 
-@app.put("/admin/announcements/{announcement_id}", response_model=AnnouncementResponse)
-def update_announcement(announcement_id: int, req: AnnouncementRequest, db: Session = Depends(get_db)) -> AnnouncementResponse:
-    row = db.execute(select(Announcement).where(Announcement.id == announcement_id)).scalar_one_or_none()
+@app.put("/admin/announcements/{announcement_id}", response_model=AdminAnnouncementResponse)
+async def update_announcement(announcement_id: int, req: AnnouncementRequest, db: AsyncSession = Depends(get_db)) -> AdminAnnouncementResponse:
+    row = (await db.execute(select(Announcement).where(Announcement.id == announcement_id))).scalar_one_or_none()
     if row is None:
         raise HTTPException(status_code=404, detail="Announcement not found")
     row.title = req.title
@@ -1045,9 +1635,8 @@ def update_announcement(announcement_id: int, req: AnnouncementRequest, db: Sess
     row.button_url = req.button_url
     row.is_active = req.is_active
     row.updated_at = now()
-    db.commit()
-    db.refresh(row)
-    return AnnouncementResponse(
+    await db.commit()
+    return AdminAnnouncementResponse(
         id=row.id,
         title=row.title,
         text=row.text,
@@ -1061,23 +1650,23 @@ def update_announcement(announcement_id: int, req: AnnouncementRequest, db: Sess
 
 
 @app.delete("/admin/announcements/{announcement_id}")
-def delete_announcement(announcement_id: int, db: Session = Depends(get_db)):
-    row = db.execute(select(Announcement).where(Announcement.id == announcement_id)).scalar_one_or_none()
+async def delete_announcement(announcement_id: int, db: AsyncSession = Depends(get_db)):
+    row = (await db.execute(select(Announcement).where(Announcement.id == announcement_id))).scalar_one_or_none()
     if row is None:
         raise HTTPException(status_code=404, detail="Announcement not found")
-    db.delete(row)
-    db.commit()
+    await db.delete(row)
+    await db.commit()
     return {"detail": "Announcement deleted"}
 
 
 @app.post("/families", response_model=FamilyResponse)
-def create_family(req: FamilyRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> FamilyResponse:
-    existing_family = db.execute(select(Family).where(Family.name == req.name)).scalar_one_or_none()
+async def create_family(req: FamilyRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> FamilyResponse:
+    existing_family = (await db.execute(select(Family).where(Family.name == req.name))).scalar_one_or_none()
     if existing_family is not None:
         raise HTTPException(status_code=409, detail="Family with this name already exists")
 
     # Check if user is already in a family
-    existing_member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+    existing_member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if existing_member is not None:
         raise HTTPException(status_code=409, detail="User is already in a family")
 
@@ -1087,7 +1676,7 @@ def create_family(req: FamilyRequest, user: User = Depends(require_user), db: Se
         created_at=now(),
     )
     db.add(family)
-    db.flush() # To get family.id
+    await db.flush() # To get family.id
 
     member = FamilyMember(
         family_id=family.id,
@@ -1095,9 +1684,8 @@ def create_family(req: FamilyRequest, user: User = Depends(require_user), db: Se
         joined_at=now(),
     )
     db.add(member)
-    db.commit()
-    db.refresh(family)
-    db.refresh(member) # For member.user to be loaded
+    await db.commit()
+    family = await get_family_with_members(db, family.id)
 
     return FamilyResponse(
         id=family.id,
@@ -1116,12 +1704,12 @@ def create_family(req: FamilyRequest, user: User = Depends(require_user), db: Se
 
 
 @app.get("/families/me", response_model=FamilyResponse)
-def get_my_family(user: User = Depends(require_user), db: Session = Depends(get_db)) -> FamilyResponse:
-    member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+async def get_my_family(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> FamilyResponse:
+    member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if member is None:
         raise HTTPException(status_code=404, detail="User is not in a family")
 
-    family = db.get(Family, member.family_id)
+    family = await get_family_with_members(db, member.family_id)
     if family is None: # Should not happen if data is consistent
         raise HTTPException(status_code=404, detail="Family not found")
 
@@ -1142,19 +1730,20 @@ def get_my_family(user: User = Depends(require_user), db: Session = Depends(get_
 
 
 @app.post("/families/leave")
-def leave_family(user: User = Depends(require_user), db: Session = Depends(get_db)) -> dict[str, str]:
+async def leave_family(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> dict[str, str]:
     # Check if user is in a family
-    member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+    member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if member is None:
         raise HTTPException(status_code=404, detail="User is not in a family")
 
-    family = db.get(Family, member.family_id)
+    family = await get_family_with_members(db, member.family_id)
     if family is None: # Should not happen if data is consistent
         raise HTTPException(status_code=404, detail="Family not found")
 
     # If user is the only member, delete the family
     if len(family.members) == 1:
-        db.delete(family)
+        await family.awaitable_attrs.goals  # loaded for the delete-orphan cascade
+        await db.delete(family)
     else:
         # If user is admin, transfer admin rights to another member or disallow leaving
         if family.admin_user_id == user.id:
@@ -1164,18 +1753,18 @@ def leave_family(user: User = Depends(require_user), db: Session = Depends(get_d
             else:
                 raise HTTPException(status_code=400, detail="Cannot leave family as the sole admin. Delete the family instead.")
 
-        db.delete(member)
-    db.commit()
+        await db.delete(member)
+    await db.commit()
     return {"status": "left"}
 
 
 @app.get("/families/me/members", response_model=List[FamilyMemberResponse])
-def get_my_family_members(user: User = Depends(require_user), db: Session = Depends(get_db)) -> List[FamilyMemberResponse]:
-    member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+async def get_my_family_members(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> List[FamilyMemberResponse]:
+    member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if member is None:
         raise HTTPException(status_code=404, detail="User is not in a family")
 
-    family = db.get(Family, member.family_id)
+    family = await get_family_with_members(db, member.family_id)
     if family is None: # Should not happen if data is consistent
         raise HTTPException(status_code=404, detail="Family not found")
 
@@ -1190,22 +1779,22 @@ def get_my_family_members(user: User = Depends(require_user), db: Session = Depe
 
 
 @app.get("/families/me/goals", response_model=FamilyGoalsResponse)
-def get_family_goals(user: User = Depends(require_user), db: Session = Depends(get_db)) -> FamilyGoalsResponse:
-    family, members = require_family_and_members(user, db)
+async def get_family_goals(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> FamilyGoalsResponse:
+    family = await require_family(user, db)
     week_start, week_end = week_bounds()
 
-    goal = db.execute(
+    goal = (await db.execute(
         select(FamilyGoal).where(
             FamilyGoal.family_id == family.id,
             FamilyGoal.week_start_epoch_day == week_start,
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
 
     steps_goal = goal.steps_goal if goal else 70000
     trainings_goal = goal.trainings_goal if goal else 6
     water_goal_ml = goal.water_goal_ml if goal else 21000
 
-    agg = aggregate_family_progress(members, week_start, week_end, db)
+    agg = await aggregate_family_progress(family.id, week_start, week_end, db)
 
     contributions = [
         FamilyGoalContribution(
@@ -1232,23 +1821,23 @@ def get_family_goals(user: User = Depends(require_user), db: Session = Depends(g
 
 
 @app.put("/families/me/goals", response_model=FamilyGoalsResponse)
-def upsert_family_goals(
+async def upsert_family_goals(
     req: FamilyGoalsUpsertRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> FamilyGoalsResponse:
-    family, members = require_family_and_members(user, db)
+    family = await require_family(user, db)
     if family.admin_user_id != user.id:
         raise HTTPException(status_code=403, detail="Only family admin can update goals")
 
     week_start, week_end = week_bounds()
 
-    goal = db.execute(
+    goal = (await db.execute(
         select(FamilyGoal).where(
             FamilyGoal.family_id == family.id,
             FamilyGoal.week_start_epoch_day == week_start,
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
 
     if goal is None:
         goal = FamilyGoal(
@@ -1264,9 +1853,9 @@ def upsert_family_goals(
         goal.steps_goal = req.steps_goal
         goal.trainings_goal = req.trainings_goal
         goal.water_goal_ml = req.water_goal_ml
-    db.commit()
+    await db.commit()
 
-    agg = aggregate_family_progress(members, week_start, week_end, db)
+    agg = await aggregate_family_progress(family.id, week_start, week_end, db)
     contributions = [
         FamilyGoalContribution(
             user_id=uid,
@@ -1291,28 +1880,28 @@ def upsert_family_goals(
     )
 
 @app.post("/families/me/invite")
-def invite_user(req: InviteUserRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> dict[str, str]:
+async def invite_user(req: InviteUserRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> dict[str, str]:
     # Check if current user is admin of a family
-    family = db.execute(select(Family).where(Family.admin_user_id == user.id)).scalar_one_or_none()
+    family = (await db.execute(select(Family).where(Family.admin_user_id == user.id))).scalar_one_or_none()
     if family is None:
         raise HTTPException(status_code=403, detail="User is not an admin of any family")
 
     # Check if target user exists
-    target_user = db.execute(select(User).where(User.login == req.login)).scalar_one_or_none()
+    target_user = (await db.execute(select(User).where(User.login == req.login))).scalar_one_or_none()
     if target_user is None:
         raise HTTPException(status_code=404, detail="Target user not found")
 
     # Check if target user is already in a family
-    existing_member = db.execute(select(FamilyMember).where(FamilyMember.user_id == target_user.id)).scalar_one_or_none()
+    existing_member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == target_user.id))).scalar_one_or_none()
     if existing_member is not None:
         raise HTTPException(status_code=409, detail="Target user is already in a family")
 
-    existing_invite = db.execute(
+    existing_invite = (await db.execute(
         select(FamilyInvite).where(
             FamilyInvite.family_id == family.id,
             FamilyInvite.invited_user_id == target_user.id,
         )
-    ).scalar_one_or_none()
+    )).scalar_one_or_none()
     if existing_invite is not None:
         raise HTTPException(status_code=409, detail="Target user already invited to this family")
 
@@ -1323,18 +1912,19 @@ def invite_user(req: InviteUserRequest, user: User = Depends(require_user), db:
         created_at=now(),
     )
     db.add(invite)
-    db.commit()
+    await db.commit()
     return {"status": "invited"}
 
 
 @app.get("/families/invites", response_model=List[FamilyInviteResponse])
-def get_family_invites(user: User = Depends(require_user), db: Session = Depends(get_db)) -> List[FamilyInviteResponse]:
+async def get_family_invites(user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> List[FamilyInviteResponse]:
     rows = (
-        db.execute(
+        (await db.execute(
             select(FamilyInvite)
             .where(FamilyInvite.invited_user_id == user.id)
+            .options(selectinload(FamilyInvite.family), selectinload(FamilyInvite.invited_by_user))
             .order_by(FamilyInvite.created_at.desc())
-        )
+        ))
         .scalars()
         .all()
     )
@@ -1352,17 +1942,17 @@ def get_family_invites(user: User = Depends(require_user), db: Session = Depends
 
 
 @app.post("/families/invites/{invite_id}/accept", response_model=FamilyResponse)
-def accept_family_invite(invite_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)) -> FamilyResponse:
+async def accept_family_invite(invite_id: int, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> FamilyResponse:
     # Cannot accept if already in a family
-    existing_member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+    existing_member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if existing_member is not None:
         raise HTTPException(status_code=409, detail="User is already in a family")
 
-    invite = db.get(FamilyInvite, invite_id)
+    invite = await db.get(FamilyInvite, invite_id)
     if invite is None or invite.invited_user_id != user.id:
         raise HTTPException(status_code=404, detail="Invite not found")
 
-    family = db.get(Family, invite.family_id)
+    family = await db.get(Family, invite.family_id)
     if family is None:
         raise HTTPException(status_code=404, detail="Family not found")
 
@@ -1375,9 +1965,9 @@ def accept_family_invite(invite_id: int, user: User = Depends(require_user), db:
     db.add(member)
 
     # Delete all invites for this user (only 1 family allowed)
-    db.execute(delete(FamilyInvite).where(FamilyInvite.invited_user_id == user.id))
-    db.commit()
-    db.refresh(family)
+    await db.execute(delete(FamilyInvite).where(FamilyInvite.invited_user_id == user.id))
+    await db.commit()
+    family = await get_family_with_members(db, family.id)
 
     return FamilyResponse(
         id=family.id,
@@ -1396,25 +1986,25 @@ def accept_family_invite(invite_id: int, user: User = Depends(require_user), db:
 
 
 @app.post("/families/invites/{invite_id}/decline")
-def decline_family_invite(invite_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)) -> dict[str, str]:
-    invite = db.get(FamilyInvite, invite_id)
+async def decline_family_invite(invite_id: int, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> dict[str, str]:
+    invite = await db.get(FamilyInvite, invite_id)
     if invite is None or invite.invited_user_id != user.id:
         raise HTTPException(status_code=404, detail="Invite not found")
 
-    db.delete(invite)
-    db.commit()
+    await db.delete(invite)
+    await db.commit()
     return {"status": "declined"}
 
 
 @app.post("/families/join", response_model=FamilyResponse)
-def join_family(req: JoinFamilyRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> FamilyResponse:
+async def join_family(req: JoinFamilyRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> FamilyResponse:
     # Check if user is already in a family
-    existing_member = db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id)).scalar_one_or_none()
+    existing_member = (await db.execute(select(FamilyMember).where(FamilyMember.user_id == user.id))).scalar_one_or_none()
     if existing_member is not None:
         raise HTTPException(status_code=409, detail="User is already in a family")
 
     # Check if family exists
-    family = db.execute(select(Family).where(Family.name == req.family_name)).scalar_one_or_none()
+    family = (await db.execute(select(Family).where(Family.name == req.family_name))).scalar_one_or_none()
     if family is None:
         raise HTTPException(status_code=404, detail="Family not found")
 
@@ -1425,9 +2015,8 @@ def join_family(req: JoinFamilyRequest, user: User = Depends(require_user), db:
         joined_at=now(),
     )
     db.add(member)
-    db.commit()
-    db.refresh(family)
-    db.refresh(member) # For member.user to be loaded
+    await db.commit()
+    family = await get_family_with_members(db, family.id)
 
     return FamilyResponse(
         id=family.id,
@@ -1445,23 +2034,27 @@ def join_family(req: JoinFamilyRequest, user: User = Depends(require_user), db:
     )
 
 
+def steps_range_query(user_id: int, start: int, end: int):
+    return (
+        select(StepEntry)
+        .where(
+            StepEntry.user_id == user_id,
+            StepEntry.date_epoch_day >= start,
+            StepEntry.date_epoch_day <= end,
+        )
+        .order_by(StepEntry.date_epoch_day.asc())
+    )
+
+
 @app.get("/steps/me", response_model=List[StepEntryResponse])
-def get_steps_me(
+async def get_steps_me(
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> List[StepEntryResponse]:
     rows = (
-        db.execute(
-            select(StepEntry)
-            .where(
-                StepEntry.user_id == user.id,
-                StepEntry.date_epoch_day >= start,
-                StepEntry.date_epoch_day <= end,
-            )
-            .order_by(StepEntry.date_epoch_day.asc())
-        )
+        (await db.execute(steps_range_query(user.id, start, end)))
         .scalars()
         .all()
     )
@@ -1476,36 +2069,21 @@ def get_steps_me(
 
 
 @app.put("/steps/me", response_model=StepEntryResponse)
-def upsert_steps_me(
+async def upsert_steps_me(
     req: StepUpsertRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> StepEntryResponse:
+    fields = {"steps": req.steps, "updated_at": now()}
+    stmt = pg_insert(StepEntry).values(user_id=user.id, date_epoch_day=req.date_epoch_day, **fields)
     row = (
-        db.execute(
-            select(StepEntry).where(
-                StepEntry.user_id == user.id,
-                StepEntry.date_epoch_day == req.date_epoch_day,
-            )
-        )
-        .scalars()
-        .one_or_none()
-    )
-
-    if row is None:
-        row = StepEntry(
-            user_id=user.id,
-            date_epoch_day=req.date_epoch_day,
-            steps=req.steps,
-            updated_at=now(),
+        await db.scalars(
+            stmt.on_conflict_do_update(constraint="uq_step_entries_user_day", set_=fields).returning(StepEntry),
+            execution_options={"populate_existing": True},
         )
-        db.add(row)
-    else:
-        row.steps = req.steps
-        row.updated_at = now()
-
-    db.commit()
-    db.refresh(row)
+    ).one()
+    await bump_daily_summary(db, user.id, [(req.date_epoch_day, {"steps": req.steps})])
+    await db.commit()
     return StepEntryResponse(
         date_epoch_day=row.date_epoch_day,
         steps=row.steps,
@@ -1513,42 +2091,49 @@ def upsert_steps_me(
     )
 
 
+def water_range_query(user_id: int, start: int, end: int, cursor: str | None = None, limit: int | None = None):
+    return (
+        select(WaterEntry)
+        .where(
+            WaterEntry.user_id == user_id,
+            WaterEntry.date_epoch_day >= start,
+            WaterEntry.date_epoch_day <= end,
+        )
+        .where(*keyset_after(WaterEntry, cursor))
+        .order_by(WaterEntry.created_at.desc(), WaterEntry.id.desc())
+        .limit(page_fetch_size(limit))
+    )
+
+
+def water_entry_json(r: WaterEntry) -> dict:
+    return {
+        "id": r.id,
+        "date_epoch_day": r.date_epoch_day,
+        "amount_ml": r.amount_ml,
+        "created_at": r.created_at.isoformat(),
+    }
+
+
 @app.get("/water/me", response_model=List[WaterEntryResponse])
-def get_water_me(
+async def get_water_me(
+    response: Response,
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
 ) -> List[WaterEntryResponse]:
-    rows = (
-        db.execute(
-            select(WaterEntry)
-            .where(
-                WaterEntry.user_id == user.id,
-                WaterEntry.date_epoch_day >= start,
-                WaterEntry.date_epoch_day <= end,
-            )
-            .order_by(WaterEntry.created_at.desc())
-        )
-        .scalars()
-        .all()
-    )
-    return [
-        WaterEntryResponse(
-            id=r.id,
-            date_epoch_day=r.date_epoch_day,
-            amount_ml=r.amount_ml,
-            created_at=r.created_at.isoformat(),
-        )
-        for r in rows
-    ]
+    rows = (await db.execute(water_range_query(user.id, start, end, cursor, limit))).scalars().all()
+    rows = page_rows(rows, limit, response)
+    return fast_json([water_entry_json(r) for r in rows], response)
 
 
 @app.post("/water/me", response_model=WaterEntryResponse)
-def create_water_me(
+async def create_water_me(
     req: WaterCreateRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> WaterEntryResponse:
     row = WaterEntry(
         user_id=user.id,
@@ -1557,8 +2142,8 @@ def create_water_me(
         created_at=now(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await bump_daily_summary(db, user.id, [(req.date_epoch_day, {"water_ml": req.amount_ml})])
+    await db.commit()
     return WaterEntryResponse(
         id=row.id,
         date_epoch_day=row.date_epoch_day,
@@ -1568,33 +2153,41 @@ def create_water_me(
 
 
 @app.delete("/water/me/{entry_id}")
-def delete_water_me(
+async def delete_water_me(
     entry_id: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
-    row = db.get(WaterEntry, entry_id)
+    row = await db.get(WaterEntry, entry_id)
     if row is None or row.user_id != user.id:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(row)
-    db.commit()
+    await record_tombstones(db, user.id, "water", [(row.id, row.date_epoch_day)])
+    await bump_daily_summary(db, user.id, [(row.date_epoch_day, {"water_ml": -row.amount_ml})])
+    await db.delete(row)
+    await db.commit()
     return {"status": "deleted"}
 
 
 @app.get("/books/me", response_model=List[BookEntryResponse])
-def get_books_me(
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+async def get_books_me(
+    response: Response,
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
 ) -> List[BookEntryResponse]:
     rows = (
-        db.execute(
+        (await db.execute(
             select(BookEntry)
             .where(BookEntry.user_id == user.id)
-            .order_by(BookEntry.created_at.desc())
-        )
+            .where(*keyset_after(BookEntry, cursor))
+            .order_by(BookEntry.created_at.desc(), BookEntry.id.desc())
+            .limit(page_fetch_size(limit))
+        ))
         .scalars()
         .all()
     )
+    rows = page_rows(rows, limit, response)
     return [
         BookEntryResponse(
             id=r.id,
@@ -1609,10 +2202,10 @@ def get_books_me(
 
 
 @app.post("/books/me", response_model=BookEntryResponse)
-def create_book_me(
+async def create_book_me(
     req: BookCreateRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> BookEntryResponse:
     row = BookEntry(
         user_id=user.id,
@@ -1621,10 +2214,10 @@ def create_book_me(
         total_pages=req.total_pages,
         pages_read=0,
         created_at=now(),
+        updated_at=now(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await db.commit()
     return BookEntryResponse(
         id=row.id,
         title=row.title,
@@ -1636,18 +2229,18 @@ def create_book_me(
 
 
 @app.put("/books/me/{entry_id}", response_model=BookEntryResponse)
-def update_book_progress_me(
+async def update_book_progress_me(
     entry_id: int,
     req: BookProgressRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> BookEntryResponse:
-    row = db.get(BookEntry, entry_id)
+    row = await db.get(BookEntry, entry_id)
     if row is None or row.user_id != user.id:
         raise HTTPException(status_code=404, detail="Not found")
     row.pages_read = req.pages_read
-    db.commit()
-    db.refresh(row)
+    row.updated_at = now()
+    await db.commit()
     return BookEntryResponse(
         id=row.id,
         title=row.title,
@@ -1659,58 +2252,66 @@ def update_book_progress_me(
 
 
 @app.delete("/books/me/{entry_id}")
-def delete_book_me(
+async def delete_book_me(
     entry_id: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
-    row = db.get(BookEntry, entry_id)
+    row = await db.get(BookEntry, entry_id)
     if row is None or row.user_id != user.id:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(row)
-    db.commit()
+    await record_tombstones(db, user.id, "book", [(row.id, None)])
+    await db.delete(row)
+    await db.commit()
     return {"status": "deleted"}
 
 
+def training_range_query(user_id: int, start: int, end: int, cursor: str | None = None, limit: int | None = None):
+    return (
+        select(TrainingEntry)
+        .where(
+            TrainingEntry.user_id == user_id,
+            TrainingEntry.date_epoch_day >= start,
+            TrainingEntry.date_epoch_day <= end,
+        )
+        .where(*keyset_after(TrainingEntry, cursor))
+        .order_by(TrainingEntry.created_at.desc(), TrainingEntry.id.desc())
+        .limit(page_fetch_size(limit))
+    )
+
+
+def training_entry_json(r: TrainingEntry) -> dict:
+    return {
+        "id": r.id,
+        "date_epoch_day": r.date_epoch_day,
+        "title": r.title,
+        "description": r.description,
+        "calories_burned": r.calories_burned,
+        "duration_minutes": r.duration_minutes,
+        "created_at": r.created_at.isoformat(),
+    }
+
+
 @app.get("/training/me", response_model=List[TrainingEntryResponse])
-def get_training_me(
+async def get_training_me(
+    response: Response,
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
 ) -> List[TrainingEntryResponse]:
-    rows = (
-        db.execute(
-            select(TrainingEntry)
-            .where(
-                TrainingEntry.user_id == user.id,
-                TrainingEntry.date_epoch_day >= start,
-                TrainingEntry.date_epoch_day <= end,
-            )
-            .order_by(TrainingEntry.created_at.desc())
-        )
-        .scalars()
-        .all()
-    )
-    return [
-        TrainingEntryResponse(
-            id=r.id,
-            date_epoch_day=r.date_epoch_day,
-            title=r.title,
-            description=r.description,
-            calories_burned=r.calories_burned,
-            duration_minutes=r.duration_minutes,
-            created_at=r.created_at.isoformat(),
-        )
-        for r in rows
-    ]
+    rows = (await db.execute(training_range_query(user.id, start, end, cursor, limit))).scalars().all()
+    rows = page_rows(rows, limit, response)
+    return fast_json([training_entry_json(r) for r in rows], response)
 
 
 @app.post("/training/me", response_model=TrainingEntryResponse)
-def create_training_me(
+async def create_training_me(
     req: TrainingCreateRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> TrainingEntryResponse:
     row = TrainingEntry(
         user_id=user.id,
@@ -1722,8 +2323,10 @@ def create_training_me(
         created_at=now(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await bump_daily_summary(
+        db, user.id, [(req.date_epoch_day, {"kcal_burned": req.calories_burned, "training_count": 1})]
+    )
+    await db.commit()
     return TrainingEntryResponse(
         id=row.id,
         date_epoch_day=row.date_epoch_day,
@@ -1736,52 +2339,102 @@ def create_training_me(
 
 
 @app.delete("/training/me/{entry_id}")
-def delete_training_me(
+async def delete_training_me(
     entry_id: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
-    row = db.get(TrainingEntry, entry_id)
+    row = await db.get(TrainingEntry, entry_id)
     if row is None or row.user_id != user.id:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(row)
-    db.commit()
+    await record_tombstones(db, user.id, "training", [(row.id, row.date_epoch_day)])
+    await bump_daily_summary(
+        db, user.id, [(row.date_epoch_day, {"kcal_burned": -row.calories_burned, "training_count": -1})]
+    )
+    await db.delete(row)
+    await db.commit()
     return {"status": "deleted"}
 
 
 @app.delete("/water/me")
-def clear_water_day_me(
+async def clear_water_day_me(
     date_epoch_day: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
-    db.execute(
-        delete(WaterEntry).where(
+    deleted = (await db.execute(
+        delete(WaterEntry)
+        .where(
             WaterEntry.user_id == user.id,
             WaterEntry.date_epoch_day == date_epoch_day,
         )
-    )
-    db.commit()
+        .returning(WaterEntry.id, WaterEntry.date_epoch_day, WaterEntry.amount_ml)
+    )).all()
+    await record_tombstones(db, user.id, "water", [(entry_id, day) for entry_id, day, _ in deleted])
+    await bump_daily_summary(db, user.id, [(day, {"water_ml": -amount_ml}) for _, day, amount_ml in deleted])
+    await db.commit()
     return {"status": "cleared"}
 
 
+def summary_range_query(user_id: int, start: int, end: int):
+    return (
+        select(DailySummary)
+        .where(
+            DailySummary.user_id == user_id,
+            DailySummary.date_epoch_day >= start,
+            DailySummary.date_epoch_day <= end,
+        )
+        .order_by(DailySummary.date_epoch_day.asc())
+    )
+
+
+@app.get("/summary/me", response_model=List[DailySummaryResponse])
+async def get_summary_me(
+    start: int,
+    end: int,
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+) -> List[DailySummaryResponse]:
+    rows = (
+        (await db.execute(summary_range_query(user.id, start, end)))
+        .scalars()
+        .all()
+    )
+    return [
+        DailySummaryResponse(
+            date_epoch_day=r.date_epoch_day,
+            water_ml=r.water_ml,
+            kcal_in=r.kcal_in,
+            kcal_burned=r.kcal_burned,
+            training_count=r.training_count,
+            steps=r.steps,
+            weight_kg=r.weight_kg,
+        )
+        for r in rows
+    ]
+
+
+def weight_range_query(user_id: int, start: int, end: int):
+    return (
+        select(WeightEntry)
+        .where(
+            WeightEntry.user_id == user_id,
+            WeightEntry.date_epoch_day >= start,
+            WeightEntry.date_epoch_day <= end,
+        )
+        .order_by(WeightEntry.date_epoch_day.asc())
+    )
+
+
 @app.get("/weight/me", response_model=List[WeightEntryResponse])
-def get_weight_me(
+async def get_weight_me(
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> List[WeightEntryResponse]:
     rows = (
-        db.execute(
-            select(WeightEntry)
-            .where(
-                WeightEntry.user_id == user.id,
-                WeightEntry.date_epoch_day >= start,
-                WeightEntry.date_epoch_day <= end,
-            )
-            .order_by(WeightEntry.date_epoch_day.asc())
-        )
+        (await db.execute(weight_range_query(user.id, start, end)))
         .scalars()
         .all()
     )
@@ -1796,37 +2449,21 @@ def get_weight_me(
 
 
 @app.put("/weight/me", response_model=WeightEntryResponse)
-def upsert_weight_me(
+async def upsert_weight_me(
     req: WeightUpsertRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> WeightEntryResponse:
+    fields = {"weight_kg": req.weight_kg, "updated_at": now()}
+    stmt = pg_insert(WeightEntry).values(user_id=user.id, date_epoch_day=req.date_epoch_day, created_at=fields["updated_at"], **fields)
     row = (
-        db.execute(
-            select(WeightEntry).where(
-                WeightEntry.user_id == user.id,
-                WeightEntry.date_epoch_day == req.date_epoch_day,
-            )
-        )
-        .scalars()
-        .one_or_none()
-    )
-
-    if row is None:
-        row = WeightEntry(
-            user_id=user.id,
-            date_epoch_day=req.date_epoch_day,
-            weight_kg=req.weight_kg,
-            created_at=now(),
-            updated_at=now(),
+        await db.scalars(
+            stmt.on_conflict_do_update(constraint="uq_weight_entries_user_day", set_=fields).returning(WeightEntry),
+            execution_options={"populate_existing": True},
         )
-        db.add(row)
-    else:
-        row.weight_kg = req.weight_kg
-        row.updated_at = now()
-
-    db.commit()
-    db.refresh(row)
+    ).one()
+    await bump_daily_summary(db, user.id, [(req.date_epoch_day, {"weight_kg": req.weight_kg})])
+    await db.commit()
     return WeightEntryResponse(
         date_epoch_day=row.date_epoch_day,
         weight_kg=row.weight_kg,
@@ -1835,11 +2472,11 @@ def upsert_weight_me(
 
 
 @app.get("/smoke/me", response_model=SmokeStatusResponse)
-def get_smoke_me(
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+async def get_smoke_me(
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> SmokeStatusResponse:
-    row = db.execute(select(SmokeStatus).where(SmokeStatus.user_id == user.id)).scalar_one_or_none()
+    row = (await db.execute(select(SmokeStatus).where(SmokeStatus.user_id == user.id))).scalar_one_or_none()
     if row is None:
         row = SmokeStatus(
             user_id=user.id,
@@ -1850,8 +2487,7 @@ def get_smoke_me(
             updated_at=now(),
         )
         db.add(row)
-        db.commit()
-        db.refresh(row)
+        await db.commit()
     return SmokeStatusResponse(
         started_at=row.started_at.isoformat(),
         is_active=row.is_active,
@@ -1861,43 +2497,50 @@ def get_smoke_me(
     )
 
 
+def food_range_query(user_id: int, start: int, end: int, cursor: str | None = None, limit: int | None = None):
+    return (
+        select(FoodEntry)
+        .where(
+            FoodEntry.user_id == user_id,
+            FoodEntry.date_epoch_day >= start,
+            FoodEntry.date_epoch_day <= end,
+        )
+        .where(*keyset_after(FoodEntry, cursor))
+        .order_by(FoodEntry.created_at.desc(), FoodEntry.id.desc())
+        .limit(page_fetch_size(limit))
+    )
+
+
+def food_entry_json(r: FoodEntry) -> dict:
+    return {
+        "id": r.id,
+        "date_epoch_day": r.date_epoch_day,
+        "title": r.title,
+        "calories": r.calories,
+        "created_at": r.created_at.isoformat(),
+    }
+
+
 @app.get("/food/me", response_model=List[FoodEntryResponse])
-def get_food_me(
+async def get_food_me(
+    response: Response,
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
 ) -> List[FoodEntryResponse]:
-    rows = (
-        db.execute(
-            select(FoodEntry)
-            .where(
-                FoodEntry.user_id == user.id,
-                FoodEntry.date_epoch_day >= start,
-                FoodEntry.date_epoch_day <= end,
-            )
-            .order_by(FoodEntry.created_at.desc())
-        )
-        .scalars()
-        .all()
-    )
-    return [
-        FoodEntryResponse(
-            id=r.id,
-            date_epoch_day=r.date_epoch_day,
-            title=r.title,
-            calories=r.calories,
-            created_at=r.created_at.isoformat(),
-        )
-        for r in rows
-    ]
+    rows = (await db.execute(food_range_query(user.id, start, end, cursor, limit))).scalars().all()
+    rows = page_rows(rows, limit, response)
+    return fast_json([food_entry_json(r) for r in rows], response)
 
 
 @app.post("/food/me", response_model=FoodEntryResponse)
-def create_food_me(
+async def create_food_me(
     req: FoodCreateRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> FoodEntryResponse:
     row = FoodEntry(
         user_id=user.id,
@@ -1907,8 +2550,8 @@ def create_food_me(
         created_at=now(),
     )
     db.add(row)
-    db.commit()
-    db.refresh(row)
+    await bump_daily_summary(db, user.id, [(req.date_epoch_day, {"kcal_in": req.calories})])
+    await db.commit()
     return FoodEntryResponse(
         id=row.id,
         date_epoch_day=row.date_epoch_day,
@@ -1919,46 +2562,43 @@ def create_food_me(
 
 
 @app.delete("/food/me/{entry_id}")
-def delete_food_me(
+async def delete_food_me(
     entry_id: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> dict[str, str]:
-    row = db.get(FoodEntry, entry_id)
+    row = await db.get(FoodEntry, entry_id)
     if row is None or row.user_id != user.id:
         raise HTTPException(status_code=404, detail="Not found")
-    db.delete(row)
-    db.commit()
+    await record_tombstones(db, user.id, "food", [(row.id, row.date_epoch_day)])
+    await bump_daily_summary(db, user.id, [(row.date_epoch_day, {"kcal_in": -row.calories})])
+    await db.delete(row)
+    await db.commit()
     return {"status": "deleted"}
 
 
 @app.put("/smoke/me", response_model=SmokeStatusResponse)
-def upsert_smoke_me(
+async def upsert_smoke_me(
     req: SmokeStatusRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> SmokeStatusResponse:
     started_at = dt.datetime.fromisoformat(req.started_at.replace("Z", "+00:00"))
-    row = db.execute(select(SmokeStatus).where(SmokeStatus.user_id == user.id)).scalar_one_or_none()
-    if row is None:
-        row = SmokeStatus(
-            user_id=user.id,
-            started_at=started_at,
-            is_active=req.is_active,
-            pack_price=req.pack_price,
-            packs_per_day=req.packs_per_day,
-            updated_at=now(),
+    fields = {
+        "started_at": started_at,
+        "is_active": req.is_active,
+        "pack_price": req.pack_price,
+        "packs_per_day": req.packs_per_day,
+        "updated_at": now(),
+    }
+    stmt = pg_insert(SmokeStatus).values(user_id=user.id, **fields)
+    row = (
+        await db.scalars(
+            stmt.on_conflict_do_update(constraint="uq_smoke_status_user_id", set_=fields).returning(SmokeStatus),
+            execution_options={"populate_existing": True},
         )
-        db.add(row)
-    else:
-        row.started_at = started_at
-        row.is_active = req.is_active
-        row.pack_price = req.pack_price
-        row.packs_per_day = req.packs_per_day
-        row.updated_at = now()
-
-    db.commit()
-    db.refresh(row)
+    ).one()
+    await db.commit()
     return SmokeStatusResponse(
         started_at=row.started_at.isoformat(),
         is_active=row.is_active,
@@ -1969,10 +2609,10 @@ def upsert_smoke_me(
 
 
 @app.post("/xp/me", response_model=XpEventResponse)
-def create_xp_event_me(
+async def create_xp_event_me(
     req: XpEventCreateRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> XpEventResponse:
     row = XpEvent(
         user_id=user.id,
@@ -1984,18 +2624,17 @@ def create_xp_event_me(
     )
     db.add(row)
     try:
-        db.commit()
-        db.refresh(row)
+        await db.commit()
     except IntegrityError:
-        db.rollback()
-        existing = db.execute(
+        await db.rollback()
+        existing = (await db.execute(
             select(XpEvent).where(
                 XpEvent.user_id == user.id,
                 XpEvent.date_epoch_day == req.date_epoch_day,
                 XpEvent.type == req.type,
                 XpEvent.note == req.note,
             )
-        ).scalar_one_or_none()
+        )).scalar_one_or_none()
         if existing is None:
             raise
         row = existing
@@ -2009,27 +2648,31 @@ def create_xp_event_me(
     )
 
 
+def xp_daily_query(user_id: int, start: int, end: int):
+    return (
+        select(
+            XpEvent.date_epoch_day,
+            func.sum(XpEvent.points).label("total_points"),
+        )
+        .where(
+            XpEvent.user_id == user_id,
+            XpEvent.date_epoch_day >= start,
+            XpEvent.date_epoch_day <= end,
+        )
+        .group_by(XpEvent.date_epoch_day)
+        .order_by(XpEvent.date_epoch_day)
+    )
+
+
 @app.get("/xp/me/daily", response_model=List[XpDailyAggregateResponse])
-def get_xp_daily_me(
+async def get_xp_daily_me(
     start: int,
     end: int,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> List[XpDailyAggregateResponse]:
     rows = (
-        db.execute(
-            select(
-                XpEvent.date_epoch_day,
-                func.sum(XpEvent.points).label("total_points"),
-            )
-            .where(
-                XpEvent.user_id == user.id,
-                XpEvent.date_epoch_day >= start,
-                XpEvent.date_epoch_day <= end,
-            )
-            .group_by(XpEvent.date_epoch_day)
-            .order_by(XpEvent.date_epoch_day)
-        )
+        (await db.execute(xp_daily_query(user.id, start, end)))
         .all()
     )
     return [
@@ -2042,12 +2685,12 @@ def get_xp_daily_me(
 
 
 @app.get("/xp/me/total", response_model=XpTotalResponse)
-def get_xp_total_me(
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+async def get_xp_total_me(
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> XpTotalResponse:
     total = (
-        db.execute(select(func.coalesce(func.sum(XpEvent.points), 0)).where(XpEvent.user_id == user.id))
+        (await db.execute(select(func.coalesce(func.sum(XpEvent.points), 0)).where(XpEvent.user_id == user.id)))
         .scalar()
     )
     total_points = int(total) if total else 0
@@ -2056,20 +2699,155 @@ def get_xp_total_me(
     return XpTotalResponse(total_points=total_points, level=level)
 
 
+async def optional_section(read):
+    """Await an endpoint body, mapping its "not configured" 404 to None."""
+    try:
+        return await read
+    except HTTPException as e:
+        if e.status_code == 404:
+            return None
+        raise
+
+
+@app.get("/dashboard/me", response_model=DashboardResponse)
+async def get_dashboard_me(
+    start: int,
+    end: int,
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+) -> DashboardResponse:
+    # Everything the app loads on start, behind one auth check and one session. The reads
+    # share the session's connection, so they run back to back rather than concurrently.
+    return DashboardResponse(
+        start_epoch_day=start,
+        end_epoch_day=end,
+        profile=await optional_section(get_profile(user, db)),
+        user_settings=await optional_section(get_user_settings(user, db)),
+        steps=await get_steps_me(start, end, user, db),
+        water=[water_entry_json(r) for r in (await db.execute(water_range_query(user.id, start, end))).scalars()],
+        food=[food_entry_json(r) for r in (await db.execute(food_range_query(user.id, start, end))).scalars()],
+        training=[training_entry_json(r) for r in (await db.execute(training_range_query(user.id, start, end))).scalars()],
+        weight=await get_weight_me(start, end, user, db),
+        summary=await get_summary_me(start, end, user, db),
+        smoke=await get_smoke_me(user, db),
+        xp_total=await get_xp_total_me(user, db),
+        announcement=await optional_section(get_announcement(Response(), None, db)),
+    )
+
+
+# Credentials never leave the server, not even in the owner's export.
+EXPORT_SECRET_COLUMNS = {"password_hash", "refresh_hash"}
+EXPORT_BATCH_SIZE = 500
+
+
+def export_sources(user_id: int) -> list:
+    """(table, condition) for every table holding rows that belong to the user."""
+    users = User.__table__
+    families = Family.__table__
+    invites = FamilyInvite.__table__
+    sources = [
+        (users, users.c.id == user_id),
+        (families, families.c.admin_user_id == user_id),
+        (invites, or_(invites.c.invited_user_id == user_id, invites.c.invited_by_user_id == user_id)),
+    ]
+    for table in Base.metadata.sorted_tables:
+        if "user_id" in table.c:
+            sources.append((table, table.c.user_id == user_id))
+    return sources
+
+
+def export_value(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    return value
+
+
+async def export_batches(user_id: int):
+    """Yield (table name, column names, rows) batches read through server-side cursors."""
+    # The request session is closed before a streaming body runs, so the export uses its own.
+    async with SessionLocal() as db:
+        for table, condition in export_sources(user_id):
+            columns = [c for c in table.c if c.name not in EXPORT_SECRET_COLUMNS]
+            result = await db.stream(
+                select(*columns)
+                .where(condition)
+                .order_by(*table.primary_key.columns)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                yield table.name, [c.name for c in columns], rows
+
+
+async def export_ndjson(user_id: int):
+    async for table, names, rows in export_batches(user_id):
+        yield "".join(
+            json.dumps({"table": table, "row": {n: export_value(v) for n, v in zip(names, row)}}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+async def export_csv(user_id: int):
+    # Tables have different columns, so each one starts with its own header row.
+    current = None
+    async for table, names, rows in export_batches(user_id):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if table != current:
+            writer.writerow(["table", *names])
+            current = table
+        writer.writerows([table, *(export_value(v) for v in row)] for row in rows)
+        yield buffer.getvalue()
+
+
+async def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@app.get("/export/me")
+async def export_me(
+    format: Annotated[str, Query(pattern="^(ndjson|csv)$")] = "ndjson",
+    gzip: bool = False,
+    user: Principal = Depends(require_principal),
+) -> StreamingResponse:
+    if format == "csv":
+        body, media_type = export_csv(user.id), "text/csv; charset=utf-8"
+    else:
+        body, media_type = export_ndjson(user.id), "application/x-ndjson"
+    filename = f"export-{user.id}.{format}"
+    if gzip:
+        body, media_type, filename = gzip_chunks(body), "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.get("/achievements/me", response_model=List[UserAchievementResponse])
-def get_achievements_me(
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+async def get_achievements_me(
+    response: Response,
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=PAGE_MAX_LIMIT)] = None,
 ) -> List[UserAchievementResponse]:
     rows = (
-        db.execute(
+        (await db.execute(
             select(UserAchievement)
             .where(UserAchievement.user_id == user.id)
-            .order_by(UserAchievement.created_at.desc())
-        )
+            .where(*keyset_after(UserAchievement, cursor))
+            .order_by(UserAchievement.created_at.desc(), UserAchievement.id.desc())
+            .limit(page_fetch_size(limit))
+        ))
         .scalars()
         .all()
     )
+    rows = page_rows(rows, limit, response)
     return [
         UserAchievementResponse(
             id=r.id,
@@ -2080,165 +2858,456 @@ def get_achievements_me(
     ]
 
 
+def sync_parse_started_at(value: str) -> dt.datetime:
+    return dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def sync_build_row(user_id: int, item: SyncBatchItem, ts: dt.datetime) -> dict:
+    """Validate a sync item payload and turn it into a column dict for its group statement."""
+    payload = item.payload
+    key = (item.entity_type, item.action)
+    if key == ("water", "create"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "amount_ml": payload["amount_ml"],
+            "created_at": ts,
+        }
+    if key == ("food", "create"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "title": payload["title"],
+            "calories": payload["calories"],
+            "created_at": ts,
+        }
+    if key == ("training", "create"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "title": payload["title"],
+            "description": payload.get("description"),
+            "calories_burned": payload.get("calories_burned", 0),
+            "duration_minutes": payload.get("duration_minutes", 0),
+            "created_at": ts,
+        }
+    if key == ("book", "create"):
+        return {
+            "user_id": user_id,
+            "title": payload["title"],
+            "author": payload.get("author"),
+            "total_pages": payload["total_pages"],
+            "pages_read": 0,
+            "created_at": ts,
+            "updated_at": ts,
+        }
+    if key == ("book", "update_progress"):
+        return {"entry_id": payload["id"], "new_pages_read": payload["pages_read"]}
+    if key == ("xp_event", "create"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "type": payload["type"],
+            "points": payload["points"],
+            "note": payload.get("note"),
+            "created_at": ts,
+        }
+    if key == ("weight", "upsert"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "weight_kg": payload["weight_kg"],
+            "created_at": ts,
+            "updated_at": ts,
+        }
+    if key == ("smoke_status", "upsert"):
+        row = {
+            "user_id": user_id,
+            "started_at": sync_parse_started_at(payload["started_at"]),
+            "is_active": payload["is_active"],
+            "updated_at": ts,
+        }
+        if "pack_price" in payload:
+            row["pack_price"] = payload["pack_price"]
+        if "packs_per_day" in payload:
+            row["packs_per_day"] = payload["packs_per_day"]
+        return row
+    if key == ("steps", "upsert"):
+        return {
+            "user_id": user_id,
+            "date_epoch_day": payload["date_epoch_day"],
+            "steps": payload["steps"],
+            "updated_at": ts,
+        }
+    raise KeyError(key)
+
+
+SYNC_INSERT_MODELS = {
+    ("water", "create"): WaterEntry,
+    ("food", "create"): FoodEntry,
+    ("training", "create"): TrainingEntry,
+    ("book", "create"): BookEntry,
+}
+
+# Keeps multi-row statements well below the 65535 bind parameter limit of the Postgres protocol.
+SYNC_STATEMENT_CHUNK_SIZE = 1000
+
+SYNC_SUPPORTED_ACTIONS = set(SYNC_INSERT_MODELS) | {
+    ("book", "update_progress"),
+    ("xp_event", "create"),
+    ("weight", "upsert"),
+    ("smoke_status", "upsert"),
+    ("steps", "upsert"),
+}
+
+
+# How each synced row moves the daily_summary rollup.
+SYNC_DAILY_SUMMARY_DELTAS = {
+    ("water", "create"): lambda row: {"water_ml": row["amount_ml"]},
+    ("food", "create"): lambda row: {"kcal_in": row["calories"]},
+    ("training", "create"): lambda row: {"kcal_burned": row["calories_burned"], "training_count": 1},
+    ("steps", "upsert"): lambda row: {"steps": row["steps"]},
+    ("weight", "upsert"): lambda row: {"weight_kg": row["weight_kg"]},
+}
+
+
+def last_row_per_day(rows: list[dict]) -> list[dict]:
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement,
+    # so collapse repeated days keeping the latest item, as sequential upserts would.
+    by_day: dict[int, dict] = {}
+    for row in rows:
+        by_day[row["date_epoch_day"]] = row
+    return list(by_day.values())
+
+
+async def sync_apply_group(db: AsyncSession, user_id: int, key: tuple[str, str], rows: list[dict]) -> None:
+    """Write one (entity_type, action) group of a sync batch with a single statement."""
+    if key in SYNC_INSERT_MODELS:
+        await db.execute(insert(SYNC_INSERT_MODELS[key]).values(rows))
+    elif key == ("xp_event", "create"):
+        await db.execute(
+            pg_insert(XpEvent)
+            .values(rows)
+            .on_conflict_do_nothing(constraint="uq_xp_events_user_day_type_note")
+        )
+    elif key == ("steps", "upsert"):
+        stmt = pg_insert(StepEntry).values(last_row_per_day(rows))
+        await db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_step_entries_user_day",
+                set_={"steps": stmt.excluded.steps, "updated_at": stmt.excluded.updated_at},
+            )
+        )
+    elif key == ("weight", "upsert"):
+        stmt = pg_insert(WeightEntry).values(last_row_per_day(rows))
+        await db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_weight_entries_user_day",
+                set_={"weight_kg": stmt.excluded.weight_kg, "updated_at": stmt.excluded.updated_at},
+            )
+        )
+    elif key == ("smoke_status", "upsert"):
+        # Fold the items into the single per-user row: started_at only applies on insert,
+        # prices keep their previous value unless an item carries them.
+        merged = dict(rows[0])
+        for row in rows[1:]:
+            merged.update({k: v for k, v in row.items() if k != "started_at"})
+        updates = {k: merged[k] for k in ("is_active", "pack_price", "packs_per_day", "updated_at") if k in merged}
+        merged.setdefault("pack_price", 0.0)
+        merged.setdefault("packs_per_day", 0.0)
+        await db.execute(
+            pg_insert(SmokeStatus)
+            .values([merged])
+            .on_conflict_do_update(constraint="uq_smoke_status_user_id", set_=updates)
+        )
+    elif key == ("book", "update_progress"):
+        books = BookEntry.__table__
+        await db.execute(
+            update(books)
+            .where(books.c.id == bindparam("entry_id"), books.c.user_id == user_id)
+            .values(pages_read=bindparam("new_pages_read"), updated_at=now()),
+            rows,
+        )
+    else:
+        raise KeyError(key)
+
+    if key in SYNC_DAILY_SUMMARY_DELTAS:
+        delta = SYNC_DAILY_SUMMARY_DELTAS[key]
+        await bump_daily_summary(db, user_id, [(row["date_epoch_day"], delta(row)) for row in rows])
+
+
+async def claim_sync_operations(db: AsyncSession, user_id: int, op_ids: list[str], ts: dt.datetime) -> set[str]:
+    """Record client operation ids in the ledger and return the ones seen for the first time."""
+    claimed: set[str] = set()
+    for i in range(0, len(op_ids), SYNC_STATEMENT_CHUNK_SIZE):
+        chunk = op_ids[i:i + SYNC_STATEMENT_CHUNK_SIZE]
+        claimed.update(
+            (await db.execute(
+                pg_insert(SyncOperation)
+                .values([{"user_id": user_id, "client_op_id": op_id, "created_at": ts} for op_id in chunk])
+                .on_conflict_do_nothing()
+                .returning(SyncOperation.client_op_id)
+            )).scalars()
+        )
+    return claimed
+
+
+async def sync_apply_entries(
+    db: AsyncSession,
+    user_id: int,
+    key: tuple[str, str],
+    entries: list[tuple[str | None, dict]],
+    ts: dt.datetime,
+) -> int:
+    """Claim the entries' operation ids and write the rows not seen before; returns how many were replays."""
+    op_ids = list(dict.fromkeys(op_id for op_id, _ in entries if op_id is not None))
+    claimed = await claim_sync_operations(db, user_id, op_ids, ts)
+    rows = []
+    replayed = 0
+    for op_id, row in entries:
+        if op_id is None:
+            rows.append(row)
+        elif op_id in claimed:
+            claimed.discard(op_id)
+            rows.append(row)
+        else:
+            replayed += 1
+    for i in range(0, len(rows), SYNC_STATEMENT_CHUNK_SIZE):
+        await sync_apply_group(db, user_id, key, rows[i:i + SYNC_STATEMENT_CHUNK_SIZE])
+    return replayed
+
+
 @app.post("/sync/batch", response_model=SyncBatchResponse)
-def sync_batch(
+async def sync_batch(
     req: SyncBatchRequest,
-    user: User = Depends(require_user),
-    db: Session = Depends(get_db),
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
 ) -> SyncBatchResponse:
     processed = 0
     failed = 0
+    replayed = 0
     errors = []
-    
+    failed_op_ids = []
+    ts = now()
+
+    # Group items by (entity_type, action) in order of first appearance so each
+    # group is written with one set-based statement instead of a round trip per item.
+    groups: dict[tuple[str, str], list[tuple[str | None, dict]]] = {}
     for item in req.items:
+        key = (item.entity_type, item.action)
+        if key not in SYNC_SUPPORTED_ACTIONS:
+            errors.append(f"Unsupported entity/action: {item.entity_type}/{item.action}")
+            failed += 1
+            if item.client_op_id is not None:
+                failed_op_ids.append(item.client_op_id)
+            continue
         try:
-            if item.entity_type == "water" and item.action == "create":
-                payload = item.payload
-                row = WaterEntry(
-                    user_id=user.id,
-                    date_epoch_day=payload["date_epoch_day"],
-                    amount_ml=payload["amount_ml"],
-                    created_at=now(),
-                )
-                db.add(row)
-            elif item.entity_type == "food" and item.action == "create":
-                payload = item.payload
-                row = FoodEntry(
-                    user_id=user.id,
-                    date_epoch_day=payload["date_epoch_day"],
-                    title=payload["title"],
-                    calories=payload["calories"],
-                    created_at=now(),
-                )
-                db.add(row)
-            elif item.entity_type == "training" and item.action == "create":
-                payload = item.payload
-                row = TrainingEntry(
-                    user_id=user.id,
-                    date_epoch_day=payload["date_epoch_day"],
-                    title=payload["title"],
-                    description=payload.get("description"),
-                    calories_burned=payload.get("calories_burned", 0),
-                    duration_minutes=payload.get("duration_minutes", 0),
-                    created_at=now(),
-                )
-                db.add(row)
-            elif item.entity_type == "book" and item.action == "create":
-                payload = item.payload
-                row = BookEntry(
-                    user_id=user.id,
-                    title=payload["title"],
-                    author=payload.get("author"),
-                    total_pages=payload["total_pages"],
-                    pages_read=0,
-                    created_at=now(),
-                )
-                db.add(row)
-            elif item.entity_type == "book" and item.action == "update_progress":
-                payload = item.payload
-                row = db.get(BookEntry, payload["id"])
-                if row and row.user_id == user.id:
-                    row.pages_read = payload["pages_read"]
-            elif item.entity_type == "xp_event" and item.action == "create":
-                payload = item.payload
-                row = XpEvent(
-                    user_id=user.id,
-                    date_epoch_day=payload["date_epoch_day"],
-                    type=payload["type"],
-                    points=payload["points"],
-                    note=payload.get("note"),
-                    created_at=now(),
-                )
-                db.add(row)
-            elif item.entity_type == "weight" and item.action == "upsert":
-                payload = item.payload
-                row = (
-                    db.execute(
-                        select(WeightEntry).where(
-                            WeightEntry.user_id == user.id,
-                            WeightEntry.date_epoch_day == payload["date_epoch_day"],
-                        )
-                    )
-                    .scalars()
-                    .one_or_none()
-                )
-                if row is None:
-                    row = WeightEntry(
-                        user_id=user.id,
-                        date_epoch_day=payload["date_epoch_day"],
-                        weight_kg=payload["weight_kg"],
-                        created_at=now(),
-                        updated_at=now(),
-                    )
-                    db.add(row)
-                else:
-                    row.weight_kg = payload["weight_kg"]
-                    row.updated_at = now()
-            elif item.entity_type == "smoke_status" and item.action == "upsert":
-                payload = item.payload
-                started_at = dt.datetime.fromisoformat(payload["started_at"].replace("Z", "+00:00"))
-                row = db.execute(select(SmokeStatus).where(SmokeStatus.user_id == user.id)).scalar_one_or_none()
-                if row is None:
-                    row = SmokeStatus(
-                        user_id=user.id,
-                        started_at=started_at,
-                        is_active=payload["is_active"],
-                        pack_price=payload.get("pack_price", 0.0),
-                        packs_per_day=payload.get("packs_per_day", 0.0),
-                        updated_at=now(),
-                    )
-                    db.add(row)
-                else:
-                    row.is_active = payload["is_active"]
-                    row.pack_price = payload.get("pack_price", row.pack_price)
-                    row.packs_per_day = payload.get("packs_per_day", row.packs_per_day)
-                    row.updated_at = now()
-            elif item.entity_type == "steps" and item.action == "upsert":
-                payload = item.payload
-                row = (
-                    db.execute(
-                        select(StepEntry).where(
-                            StepEntry.user_id == user.id,
-                            StepEntry.date_epoch_day == payload["date_epoch_day"],
-                        )
-                    )
-                    .scalars()
-                    .one_or_none()
-                )
-                if row is None:
-                    row = StepEntry(
-                        user_id=user.id,
-                        date_epoch_day=payload["date_epoch_day"],
-                        steps=payload["steps"],
-                        updated_at=now(),
-                    )
-                    db.add(row)
-                else:
-                    row.steps = payload["steps"]
-                    row.updated_at = now()
-            else:
-                errors.append(f"Unsupported entity/action: {item.entity_type}/{item.action}")
-                failed += 1
-                continue
-            
-            processed += 1
+            row = sync_build_row(user.id, item, ts)
         except Exception as e:
             errors.append(f"Error processing {item.entity_type}/{item.action}: {str(e)}")
             failed += 1
-    
-    db.commit()
-    return SyncBatchResponse(processed=processed, failed=failed, errors=errors)
+            if item.client_op_id is not None:
+                failed_op_ids.append(item.client_op_id)
+            continue
+        groups.setdefault(key, []).append((item.client_op_id, row))
+
+    for key, entries in groups.items():
+        try:
+            # A savepoint per group keeps one bad group from aborting the rest of the batch,
+            # and rolls back its ledger claims so a retry is not mistaken for a replay.
+            async with db.begin_nested():
+                group_replayed = await sync_apply_entries(db, user.id, key, entries, ts)
+            processed += len(entries)
+            replayed += group_replayed
+        except Exception:
+            # Redo the group one item per savepoint so only the offending items fail.
+            for op_id, row in entries:
+                try:
+                    async with db.begin_nested():
+                        replayed += await sync_apply_entries(db, user.id, key, [(op_id, row)], ts)
+                    processed += 1
+                except Exception as e:
+                    entity_type, action = key
+                    reason = getattr(e, "orig", None) or e
+                    errors.append(f"Error processing {entity_type}/{action}: {str(reason)}")
+                    failed += 1
+                    if op_id is not None:
+                        failed_op_ids.append(op_id)
+
+    if any(item.client_op_id is not None for item in req.items):
+        await db.execute(
+            delete(SyncOperation).where(
+                SyncOperation.user_id == user.id,
+                SyncOperation.created_at < ts - dt.timedelta(seconds=settings.SYNC_OP_LEDGER_TTL_SECONDS),
+            )
+        )
+    await db.commit()
+    return SyncBatchResponse(
+        processed=processed, failed=failed, replayed=replayed, errors=errors, failed_op_ids=failed_op_ids
+    )
+
+
+# Cursors are the snapshot xmin of the pull that issued them, plus the issue time. Every
+# write the pull could not see carries a change_xid >= that xmin (see migration 0027), so
+# the next pull re-reads from there: a few rows may come twice, none are skipped.
+SYNC_CURSOR_PREFIX = "x"
+SYNC_SNAPSHOT_XMIN = text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+
+
+@dataclass(frozen=True, slots=True)
+class SyncCursor:
+    issued_at: dt.datetime
+    # None for cursors issued before change_xid existed; those are answered from row timestamps once more.
+    xmin: int | None = None
+
+
+def parse_sync_cursor(cursor: str | None) -> SyncCursor | None:
+    if not cursor:
+        return None
+    try:
+        if cursor.startswith(SYNC_CURSOR_PREFIX):
+            xmin, issued_ms = cursor.removeprefix(SYNC_CURSOR_PREFIX).split(".")
+            parsed = SyncCursor(dt.datetime.fromtimestamp(int(issued_ms) / 1000, tz=dt.timezone.utc), int(xmin))
+        else:
+            parsed = SyncCursor(dt.datetime.fromtimestamp(int(cursor) / 1000, tz=dt.timezone.utc))
+    except (ValueError, OverflowError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if now() - parsed.issued_at > SYNC_CURSOR_TTL:
+        # Tombstones older than this are pruned, so deletions could no longer be reported.
+        raise HTTPException(status_code=410, detail="Cursor expired, sync again without since")
+    return parsed
+
+
+def format_sync_cursor(xmin: int, issued_at: dt.datetime) -> str:
+    return f"{SYNC_CURSOR_PREFIX}{xmin}.{int(issued_at.timestamp() * 1000)}"
+
+
+def sync_changes_query(model, column, user_id: int, since: SyncCursor | None):
+    q = select(model).where(model.user_id == user_id)
+    if since is not None and since.xmin is not None:
+        q = q.where(model.change_xid >= since.xmin)
+    elif since is not None:
+        q = q.where(column >= since.issued_at)
+    return q.order_by(column.asc())
+
+
+@app.get("/sync/changes", response_model=SyncChangesResponse)
+async def get_sync_changes(
+    since: str | None = None,
+    user: Principal = Depends(require_principal),
+    db: AsyncSession = Depends(get_db),
+) -> SyncChangesResponse:
+    since_cursor = parse_sync_cursor(since)
+    # Taken before the reads: each later statement's snapshot sees at least as much.
+    xmin = (await db.execute(SYNC_SNAPSHOT_XMIN)).scalar_one()
+    read_at = now()
+
+    async def changed(model, column):
+        return (await db.execute(sync_changes_query(model, column, user.id, since_cursor))).scalars().all()
+
+    steps = await changed(StepEntry, StepEntry.updated_at)
+    water = await changed(WaterEntry, WaterEntry.created_at)
+    food = await changed(FoodEntry, FoodEntry.created_at)
+    training = await changed(TrainingEntry, TrainingEntry.created_at)
+    weight = await changed(WeightEntry, WeightEntry.updated_at)
+    books = await changed(BookEntry, BookEntry.updated_at)
+    xp_events = await changed(XpEvent, XpEvent.created_at)
+    deleted = []
+    if since_cursor is not None:
+        deleted = await changed(SyncTombstone, SyncTombstone.deleted_at)
+
+    return SyncChangesResponse(
+        cursor=format_sync_cursor(xmin, read_at),
+        steps=[
+            StepEntryResponse(
+                date_epoch_day=r.date_epoch_day,
+                steps=r.steps,
+                updated_at=r.updated_at.isoformat(),
+            )
+            for r in steps
+        ],
+        water=[
+            WaterEntryResponse(
+                id=r.id,
+                date_epoch_day=r.date_epoch_day,
+                amount_ml=r.amount_ml,
+                created_at=r.created_at.isoformat(),
+            )
+            for r in water
+        ],
+        food=[
+            FoodEntryResponse(
+                id=r.id,
+                date_epoch_day=r.date_epoch_day,
+                title=r.title,
+                calories=r.calories,
+                created_at=r.created_at.isoformat(),
+            )
+            for r in food
+        ],
+        training=[
+            TrainingEntryResponse(
+                id=r.id,
+                date_epoch_day=r.date_epoch_day,
+                title=r.title,
+                description=r.description,
+                calories_burned=r.calories_burned,
+                duration_minutes=r.duration_minutes,
+                created_at=r.created_at.isoformat(),
+            )
+            for r in training
+        ],
+        weight=[
+            WeightEntryResponse(
+                date_epoch_day=r.date_epoch_day,
+                weight_kg=r.weight_kg,
+                updated_at=r.updated_at.isoformat(),
+            )
+            for r in weight
+        ],
+        books=[
+            BookEntryResponse(
+                id=r.id,
+                title=r.title,
+                author=r.author,
+                total_pages=r.total_pages,
+                pages_read=r.pages_read,
+                created_at=r.created_at.isoformat(),
+            )
+            for r in books
+        ],
+        xp_events=[
+            XpEventResponse(
+                id=r.id,
+                date_epoch_day=r.date_epoch_day,
+                type=r.type,
+                points=r.points,
+                note=r.note,
+                created_at=r.created_at.isoformat(),
+            )
+            for r in xp_events
+        ],
+        deleted=[
+            SyncTombstoneResponse(
+                entity_type=t.entity_type,
+                id=t.entity_id,
+                date_epoch_day=t.date_epoch_day,
+                deleted_at=t.deleted_at.isoformat(),
+            )
+            for t in deleted
+        ],
+    )
 
 
-def require_admin_user(request: Request, db: Session = Depends(get_db)) -> AdminUser:
-    return require_admin_session(request, db)
+async def require_admin_user(request: Request, db: AsyncSession = Depends(get_db)) -> AdminUser:
+    return await require_admin_session(request, db)
 
 
 @app.get("/admin/api/settings", response_model=AdminSettingsResponse)
-def get_admin_settings(
-    db: Session = Depends(get_db),
+async def get_admin_settings(
+    db: AsyncSession = Depends(get_db),
 ) -> AdminSettingsResponse:
-    row = db.execute(select(AdminSettings)).scalar_one_or_none()
+    row = (await db.execute(select(AdminSettings))).scalar_one_or_none()
     if row is None:
         # Create default settings
         row = AdminSettings(
@@ -2263,8 +3332,8 @@ def get_admin_settings(
             updated_at=now(),
         )
         db.add(row)
-        db.commit()
-        db.refresh(row)
+        await db.commit()
+        admin_settings_cache.invalidate()
     
     return AdminSettingsResponse(
         gigachat_client_id=row.gigachat_client_id,
@@ -2289,50 +3358,102 @@ def get_admin_settings(
     )
 
 
+async def build_gigachat_payload(
+    req: AiChatRequest, token: str, credentials_fingerprint: str
+) -> tuple[dict, list[tuple[str, str]]]:
+    """Return the completion payload and the file cache keys it reuses."""
+    attachments: list[str] = []
+    reused_files: list[tuple[str, str]] = []
+    if req.image_base64:
+        image_bytes = decode_base64_image(req.image_base64)
+        file_id, cache_key = await gigachat_upload_image_cached(token, credentials_fingerprint, image_bytes)
+        attachments.append(file_id)
+        if cache_key is not None:
+            reused_files.append(cache_key)
+
+    messages = []
+    for msg in req.messages:
+        message: dict = {"role": msg.role, "content": msg.content}
+        if attachments and msg.role == "user":
+            message["attachments"] = attachments
+            attachments = []
+        messages.append(message)
+
+    payload = {
+        "model": req.model or "GigaChat",
+        "messages": messages,
+    }
+    if req.max_tokens is not None:
+        payload["max_tokens"] = req.max_tokens
+    if req.temperature is not None:
+        payload["temperature"] = req.temperature
+    return payload, reused_files
+
+
 @app.post("/ai/chat", response_model=AiChatResponse)
-async def ai_chat(req: AiChatRequest, user: User = Depends(require_user), db: Session = Depends(get_db)) -> AiChatResponse:
-    settings_row = db.execute(select(AdminSettings)).scalar_one_or_none()
+async def ai_chat(req: AiChatRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> AiChatResponse:
+    settings_row = await admin_settings_cache.get(db)
     if settings_row is None or not settings_row.gigachat_auth_key:
         raise HTTPException(status_code=400, detail="GigaChat settings not configured")
+    # Nothing below needs the request session; hand its connection back before queueing
+    # for a slot and the upstream call, or AI traffic alone could drain the pool.
+    await db.close()
 
-    async with gigachat_request_lock:
+    async with ai_dispatcher.slot():
         token = await get_gigachat_access_token(settings_row)
+        # The token was issued for exactly these credentials, so their fingerprint scopes its file ids.
+        payload, reused_files = await build_gigachat_payload(req, token, gigachat_settings_fingerprint(settings_row))
+        with forget_cached_files_on_rejection(reused_files):
+            content = await gigachat_chat_completion(token, payload)
+        return AiChatResponse(content=content)
 
-        attachments: list[str] = []
-        if req.image_base64:
-            image_bytes = decode_base64_image(req.image_base64)
-            file_id = await gigachat_upload_image(token, image_bytes, f"food-{uuid.uuid4()}.jpg")
-            attachments.append(file_id)
-
-        messages = []
-        for msg in req.messages:
-            message: dict = {"role": msg.role, "content": msg.content}
-            if attachments and msg.role == "user":
-                message["attachments"] = attachments
-                attachments = []
-            messages.append(message)
-
-        payload = {
-            "model": req.model or "GigaChat",
-            "messages": messages,
-        }
-        if req.max_tokens is not None:
-            payload["max_tokens"] = req.max_tokens
-        if req.temperature is not None:
-            payload["temperature"] = req.temperature
 
-        content = await gigachat_chat_completion(token, payload)
-        return AiChatResponse(content=content)
+@app.post("/ai/chat/stream")
+async def ai_chat_stream(req: AiChatRequest, user: Principal = Depends(require_principal), db: AsyncSession = Depends(get_db)) -> StreamingResponse:
+    """Same request as /ai/chat, answered as server-sent events: `data: {"content": ...}` per
+    delta, then `event: done`. Failures after the stream has started arrive as `event: error`."""
+    settings_row = await admin_settings_cache.get(db)
+    if settings_row is None or not settings_row.gigachat_auth_key:
+        raise HTTPException(status_code=400, detail="GigaChat settings not configured")
+    await db.close()
+
+    # Everything up to the upstream response status runs before any byte is sent, so
+    # busy/auth/upload failures still surface as ordinary HTTP errors.
+    stack = AsyncExitStack()
+    await stack.enter_async_context(ai_dispatcher.slot())
+    try:
+        token = await get_gigachat_access_token(settings_row)
+        payload, reused_files = await build_gigachat_payload(req, token, gigachat_settings_fingerprint(settings_row))
+        with forget_cached_files_on_rejection(reused_files):
+            upstream = await open_gigachat_chat_stream(token, payload, stack)
+    except BaseException:
+        await stack.aclose()
+        raise
+
+    async def events():
+        try:
+            async for content in gigachat_stream_deltas(upstream):
+                yield sse_event({"content": content})
+        except (httpx.HTTPError, ValueError) as exc:
+            yield sse_event({"detail": f"GigaChat stream failed: {exc}"}, event="error")
+            return
+        yield sse_event({}, event="done")
+
+    return ReleasingStreamingResponse(
+        events(),
+        stack,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.put("/admin/api/settings", response_model=AdminSettingsResponse)
-def update_admin_settings(
+async def update_admin_settings(
     req: AdminSettingsRequest,
     admin_user: AdminUser = Depends(require_admin_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> AdminSettingsResponse:
-    global gigachat_access_token, gigachat_token_expires_at_ms
-    row = db.execute(select(AdminSettings)).scalar_one_or_none()
+    row = (await db.execute(select(AdminSettings))).scalar_one_or_none()
     if row is None:
         row = AdminSettings(
             gigachat_client_id=req.gigachat_client_id,
@@ -2361,12 +3482,8 @@ def update_admin_settings(
             row.gigachat_client_id = req.gigachat_client_id
         if req.gigachat_auth_key is not None:
             row.gigachat_auth_key = req.gigachat_auth_key
-            gigachat_access_token = None
-            gigachat_token_expires_at_ms = 0
         if req.gigachat_scope is not None:
             row.gigachat_scope = req.gigachat_scope
-            gigachat_access_token = None
-            gigachat_token_expires_at_ms = 0
         if req.openrouter_api_key is not None:
             row.openrouter_api_key = req.openrouter_api_key
         if req.openrouter_model is not None:
@@ -2405,9 +3522,13 @@ def update_admin_settings(
         elif row.announcement_button_enabled:
             row.announcement_button_enabled = False
         row.updated_at = now()
-    
-    db.commit()
-    db.refresh(row)
+
+    if req.gigachat_auth_key is not None or req.gigachat_scope is not None:
+        # Workers also notice the new credentials fingerprint on their own; dropping the row
+        # just stops anyone from reusing a token issued for the old key.
+        await db.execute(delete(GigachatToken))
+    await db.commit()
+    admin_settings_cache.invalidate()
     return AdminSettingsResponse(
         gigachat_client_id=row.gigachat_client_id,
         gigachat_auth_key=row.gigachat_auth_key,
@@ -1,10 +1,16 @@
 import datetime as dt
-from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, ForeignKey, UniqueConstraint, Float, JSON, Text
+from sqlalchemy import String, Integer, BigInteger, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, Float, JSON, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db import Base
 
 
+def change_xid_column() -> Mapped[int]:
+    """Id of the transaction that last wrote the row, stamped by the stamp_change_xid trigger
+    (migration 0027) on every insert and update. /sync/changes pages on it."""
+    return mapped_column(BigInteger, server_default="0")
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -173,27 +179,34 @@ class StepEntry(Base):
     __tablename__ = "step_entries"
     __table_args__ = (
         UniqueConstraint("user_id", "date_epoch_day", name="uq_step_entries_user_day"),
+        Index("ix_step_entries_user_id_change_xid", "user_id", "change_xid"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     steps: Mapped[int] = mapped_column(Integer)
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
 
 class BookEntry(Base):
     __tablename__ = "book_entries"
+    __table_args__ = (
+        Index("ix_book_entries_user_id_change_xid", "user_id", "change_xid"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     title: Mapped[str] = mapped_column(String(256))
     author: Mapped[str | None] = mapped_column(String(256), nullable=True)
     total_pages: Mapped[int] = mapped_column(Integer, default=0)
     pages_read: Mapped[int] = mapped_column(Integer, default=0)
-    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
@@ -202,15 +215,18 @@ class XpEvent(Base):
     __tablename__ = "xp_events"
     __table_args__ = (
         UniqueConstraint("user_id", "date_epoch_day", "type", "note", name="uq_xp_events_user_day_type_note"),
+        Index("ix_xp_events_user_id_change_xid", "user_id", "change_xid"),
+        Index("ix_xp_events_user_id_date_epoch_day", "user_id", "date_epoch_day", postgresql_include=["points"]),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     type: Mapped[str] = mapped_column(String(64), index=True)
     points: Mapped[int] = mapped_column(Integer)
     note: Mapped[str | None] = mapped_column(String(256), nullable=True)
-    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
@@ -244,6 +260,46 @@ class SyncQueue(Base):
     user: Mapped["User"] = relationship()
 
 
+class SyncOperation(Base):
+    __tablename__ = "sync_operations"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    client_op_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True)
+
+
+class DailySummary(Base):
+    """Per-user per-day rollup, maintained in the same transaction as the entry writes."""
+
+    __tablename__ = "daily_summary"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    date_epoch_day: Mapped[int] = mapped_column(Integer, primary_key=True)
+    water_ml: Mapped[int] = mapped_column(Integer, default=0)
+    kcal_in: Mapped[int] = mapped_column(Integer, default=0)
+    kcal_burned: Mapped[int] = mapped_column(Integer, default=0)
+    training_count: Mapped[int] = mapped_column(Integer, default=0)
+    steps: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    weight_kg: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_user_id_deleted_at", "user_id", "deleted_at"),
+        Index("ix_sync_tombstones_user_id_change_xid", "user_id", "change_xid"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    entity_type: Mapped[str] = mapped_column(String(64))
+    entity_id: Mapped[int] = mapped_column(Integer)
+    date_epoch_day: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    deleted_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
+
+
 class AdminSettings(Base):
     __tablename__ = "admin_settings"
 
@@ -269,6 +325,19 @@ class AdminSettings(Base):
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc), index=True)
 
 
+class GigachatToken(Base):
+    """GigaChat access token shared by all workers; a single row with id 1."""
+
+    __tablename__ = "gigachat_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # sha256 of the auth key and scope the token was issued for
+    credentials_fingerprint: Mapped[str] = mapped_column(String(64))
+    access_token: Mapped[str] = mapped_column(Text)
+    expires_at_ms: Mapped[int] = mapped_column(BigInteger)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+
+
 class Announcement(Base):
     __tablename__ = "announcements"
 
@@ -285,28 +354,40 @@ class Announcement(Base):
 
 class TrainingEntry(Base):
     __tablename__ = "training_entries"
+    __table_args__ = (
+        Index("ix_training_entries_user_id_created_at", "user_id", "created_at"),
+        Index("ix_training_entries_user_id_date_epoch_day", "user_id", "date_epoch_day", "created_at"),
+        Index("ix_training_entries_user_id_change_xid", "user_id", "change_xid"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     title: Mapped[str] = mapped_column(String(256))
     description: Mapped[str | None] = mapped_column(String(512), nullable=True)
     calories_burned: Mapped[int] = mapped_column(Integer, default=0)
     duration_minutes: Mapped[int] = mapped_column(Integer, default=0)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
 
 class FoodEntry(Base):
     __tablename__ = "food_entries"
+    __table_args__ = (
+        Index("ix_food_entries_user_id_created_at", "user_id", "created_at"),
+        Index("ix_food_entries_user_id_date_epoch_day", "user_id", "date_epoch_day", "created_at"),
+        Index("ix_food_entries_user_id_change_xid", "user_id", "change_xid"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     title: Mapped[str] = mapped_column(String(256))
     calories: Mapped[int] = mapped_column(Integer)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
@@ -315,14 +396,16 @@ class WeightEntry(Base):
     __tablename__ = "weight_entries"
     __table_args__ = (
         UniqueConstraint("user_id", "date_epoch_day", name="uq_weight_entries_user_day"),
+        Index("ix_weight_entries_user_id_change_xid", "user_id", "change_xid"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     weight_kg: Mapped[float] = mapped_column(Float)
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc))
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
@@ -346,16 +429,21 @@ class SmokeStatus(Base):
 
 class WaterEntry(Base):
     __tablename__ = "water_entries"
+    __table_args__ = (
+        Index("ix_water_entries_user_id_created_at", "user_id", "created_at"),
+        Index("ix_water_entries_user_id_date_epoch_day", "user_id", "date_epoch_day", "created_at"),
+        Index("ix_water_entries_user_id_change_xid", "user_id", "change_xid"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
-    date_epoch_day: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    date_epoch_day: Mapped[int] = mapped_column(Integer)
     amount_ml: Mapped[int] = mapped_column(Integer)
     created_at: Mapped[dt.datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: dt.datetime.now(dt.timezone.utc),
-        index=True,
     )
+    change_xid: Mapped[int] = change_xid_column()
 
     user: Mapped["User"] = relationship()
 
@@ -0,0 +1,131 @@
+"""MessagePack as an alternative wire format to JSON, chosen per request by Content-Type and Accept."""
+
+from contextvars import ContextVar
+from typing import Any
+
+import msgpack
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = MSGPACK_MEDIA_TYPES[0]
+
+# Set by MsgpackNegotiationMiddleware for the duration of a request.
+response_msgpack: ContextVar[bool] = ContextVar("response_msgpack", default=False)
+
+
+def negotiated_media_type() -> str:
+    """Media type ApiResponse will produce for the current request."""
+    return MSGPACK_MEDIA_TYPE if response_msgpack.get() else "application/json"
+
+
+def media_quality(accept: str) -> dict[str, float]:
+    offered = {}
+    for part in accept.split(","):
+        media_type, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        offered[media_type.strip().lower()] = quality
+    return offered
+
+
+def prefers_msgpack(accept: str) -> bool:
+    """True only when msgpack is acceptable and ranked above JSON; ties and wildcards keep JSON."""
+    offered = media_quality(accept)
+    msgpack_quality = max(offered.get(t, 0.0) for t in MSGPACK_MEDIA_TYPES)
+    json_quality = max(offered.get(t, 0.0) for t in ("application/json", "application/*", "*/*"))
+    return msgpack_quality > 0 and msgpack_quality > json_quality
+
+
+class ApiResponse(ORJSONResponse):
+    """Default response class: orjson, or MessagePack when the request negotiated it."""
+
+    def __init__(self, content: Any, *args, **kwargs) -> None:
+        if response_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+class MsgpackNegotiationMiddleware:
+    """Turn MessagePack request bodies into JSON for FastAPI's body parsing, and flag requests
+    whose Accept header prefers MessagePack so ApiResponse encodes the reply with it."""
+
+    def __init__(self, app: ASGIApp, max_request_size: int = 32 * 1024 * 1024) -> None:
+        self.app = app
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        if content_type in MSGPACK_MEDIA_TYPES:
+            try:
+                scope, receive = await self.json_request(scope, receive)
+            except OverflowError:
+                await PlainTextResponse("Request body too large", status_code=413)(scope, receive, send)
+                return
+            except (ValueError, TypeError):
+                await PlainTextResponse("Malformed MessagePack body", status_code=400)(scope, receive, send)
+                return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).add_vary_header("Accept")
+            await send(message)
+
+        token = response_msgpack.set(prefers_msgpack(headers.get("accept", "")))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            response_msgpack.reset(token)
+
+    async def json_request(self, scope: Scope, receive: Receive) -> tuple[Scope, Receive]:
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ValueError("Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_request_size:
+                raise OverflowError("MessagePack body too large")
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        raw = b"".join(chunks)
+        body = orjson.dumps(msgpack.unpackb(raw, raw=False, strict_map_key=True)) if raw else b""
+
+        raw_headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-type", b"content-length")]
+        raw_headers.append((b"content-type", b"application/json"))
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        scope = {**scope, "headers": raw_headers}
+
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return scope, replay
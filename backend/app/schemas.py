@@ -177,6 +177,16 @@ class WeightEntryResponse(BaseModel):
     updated_at: str
 
 
+class DailySummaryResponse(BaseModel):
+    date_epoch_day: int
+    water_ml: int
+    kcal_in: int
+    kcal_burned: int
+    training_count: int
+    steps: int | None = None
+    weight_kg: float | None = None
+
+
 class SmokeStatusRequest(BaseModel):
     started_at: str
     is_active: bool = True
@@ -275,6 +285,7 @@ class SyncBatchItem(BaseModel):
     entity_type: str = Field(min_length=1, max_length=64)
     action: str = Field(min_length=1, max_length=32)
     payload: dict
+    client_op_id: str | None = Field(default=None, min_length=1, max_length=64)
 
 
 class SyncBatchRequest(BaseModel):
@@ -284,7 +295,29 @@ class SyncBatchRequest(BaseModel):
 class SyncBatchResponse(BaseModel):
     processed: int
     failed: int
+    replayed: int = 0
     errors: List[str] = Field(default_factory=list)
+    # client_op_id of every failed item that carried one; clients retry exactly these.
+    failed_op_ids: List[str] = Field(default_factory=list)
+
+
+class SyncTombstoneResponse(BaseModel):
+    entity_type: str
+    id: int
+    date_epoch_day: int | None = None
+    deleted_at: str
+
+
+class SyncChangesResponse(BaseModel):
+    cursor: str
+    steps: List[StepEntryResponse] = Field(default_factory=list)
+    water: List[WaterEntryResponse] = Field(default_factory=list)
+    food: List[FoodEntryResponse] = Field(default_factory=list)
+    training: List[TrainingEntryResponse] = Field(default_factory=list)
+    weight: List[WeightEntryResponse] = Field(default_factory=list)
+    books: List[BookEntryResponse] = Field(default_factory=list)
+    xp_events: List[XpEventResponse] = Field(default_factory=list)
+    deleted: List[SyncTombstoneResponse] = Field(default_factory=list)
 
 
 class AdminSettingsRequest(BaseModel):
@@ -368,6 +401,22 @@ class AnnouncementReadResponse(BaseModel):
     announcement_updated_at: str
 
 
+class DashboardResponse(BaseModel):
+    start_epoch_day: int
+    end_epoch_day: int
+    profile: ProfileResponse | None = None
+    user_settings: UserSettingsResponse | None = None
+    steps: List[StepEntryResponse]
+    water: List[WaterEntryResponse]
+    food: List[FoodEntryResponse]
+    training: List[TrainingEntryResponse]
+    weight: List[WeightEntryResponse]
+    summary: List[DailySummaryResponse]
+    smoke: SmokeStatusResponse
+    xp_total: XpTotalResponse
+    announcement: AnnouncementResponse | None = None
+
+
 # Admin announcements (news) management
 class AnnouncementRequest(BaseModel):
     title: str = Field(min_length=1, max_length=256)
@@ -378,7 +427,7 @@ class AnnouncementRequest(BaseModel):
     is_active: bool = True
 
 
-class AnnouncementResponse(BaseModel):
+class AdminAnnouncementResponse(BaseModel):
     id: int
     title: str
     text: str
@@ -6,13 +6,54 @@ class Settings(BaseSettings):
 
     ENV: str = "dev"
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_PRE_PING: bool = True
 
     JWT_SECRET: str
     ACCESS_TTL_SECONDS: int = 900
     REFRESH_TTL_SECONDS: int = 60 * 60 * 24 * 30
+    # Trust access-token claims for their short lifetime instead of loading the User row per request.
+    AUTH_STATELESS_ACCESS: bool = False
+    AUTH_USER_CACHE_SIZE: int = 4096
+
+    # bcrypt runs in a dedicated process pool; callers beyond the queue limit get 429.
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    SYNC_OP_LEDGER_TTL_SECONDS: int = 60 * 60 * 24 * 30
+    # /sync/changes cursors older than this get 410 and a full resync; tombstones are pruned to match.
+    SYNC_CURSOR_TTL_SECONDS: int = 60 * 60 * 24 * 30
+
+    # Responses smaller than this go out uncompressed; compressed uploads may inflate to at most REQUEST_MAX_BODY_BYTES.
+    RESPONSE_COMPRESSION_MIN_BYTES: int = 1024
+    REQUEST_MAX_BODY_BYTES: int = 32 * 1024 * 1024
 
     ADMIN_API_KEY: str
 
+    # One pooled client per worker for GigaChat; HTTP/2 multiplexes concurrent AI calls over one connection.
+    GIGACHAT_HTTP2: bool = True
+    GIGACHAT_MAX_CONNECTIONS: int = 20
+    GIGACHAT_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    GIGACHAT_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    GIGACHAT_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    GIGACHAT_READ_TIMEOUT_SECONDS: float = 60.0
+    GIGACHAT_WRITE_TIMEOUT_SECONDS: float = 30.0
+    GIGACHAT_POOL_TIMEOUT_SECONDS: float = 10.0
+    # Concurrent /ai/chat calls per worker; extra callers queue up to AI_MAX_QUEUE, then get 429.
+    AI_MAX_CONCURRENT: int = 4
+    AI_MAX_QUEUE: int = 16
+    AI_QUEUE_TIMEOUT_SECONDS: float = 15.0
+    # Uploaded food photos are reused by content hash for this long instead of being re-uploaded.
+    AI_IMAGE_CACHE_SIZE: int = 1024
+    AI_IMAGE_CACHE_TTL_SECONDS: float = 6 * 60 * 60
+
+    # How long a worker serves its cached AdminSettings before re-checking updated_at
+    ADMIN_SETTINGS_CACHE_TTL_SECONDS: float = 5.0
+
 
 settings = Settings()
 
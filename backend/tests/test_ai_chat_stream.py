@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app.main as main
+from app.schemas import AiChatMessage, AiChatRequest
+
+
+SSE_BODY = b'data: {"choices":[{"delta":{"content":"hi"}}]}\n\ndata: [DONE]\n\n'
+
+
+@pytest.fixture
+def gigachat(monkeypatch):
+    async def settings_row(db):
+        return main.AdminSettings(gigachat_auth_key="key")
+
+    async def access_token(settings_row):
+        return "token"
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=SSE_BODY, headers={"content-type": "text/event-stream"})
+
+    monkeypatch.setattr(main.admin_settings_cache, "get", settings_row)
+    monkeypatch.setattr(main, "get_gigachat_access_token", access_token)
+    monkeypatch.setattr(main, "gigachat_http", httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+    monkeypatch.setattr(main, "ai_dispatcher", main.AiDispatcher(max_concurrent=1, max_queue=0, queue_timeout=0.1))
+
+
+class RequestSession:
+    """Stands in for the request-scoped AsyncSession; only close() is expected."""
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def chat_request() -> AiChatRequest:
+    return AiChatRequest(messages=[AiChatMessage(role="user", content="hello")])
+
+
+async def open_stream(db: RequestSession | None = None) -> main.StreamingResponse:
+    return await main.ai_chat_stream(chat_request(), user=main.Principal(id=1), db=db or RequestSession())
+
+
+def test_slot_released_when_send_fails_before_body(gigachat):
+    async def scenario():
+        response = await open_stream()
+        assert main.ai_dispatcher.active == 1
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            raise OSError("client went away")
+
+        with pytest.raises(Exception) as excinfo:
+            await response({"type": "http"}, receive, send)
+        assert excinfo.group_contains(OSError) if isinstance(excinfo.value, ExceptionGroup) else excinfo.type is OSError
+        assert main.ai_dispatcher.active == 0
+        # The freed slot admits the next request instead of shedding it.
+        await (await open_stream()).release.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_slot_released_after_full_stream(gigachat):
+    async def scenario():
+        response = await open_stream()
+        messages = []
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            messages.append(message)
+
+        await response({"type": "http"}, receive, send)
+        body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+        assert b'data: {"content": "hi"}' in body
+        assert b"event: done" in body
+        assert main.ai_dispatcher.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_request_session_closed_before_waiting_for_a_slot(gigachat):
+    async def scenario():
+        held = await open_stream()
+        db = RequestSession()
+        with pytest.raises(main.HTTPException) as excinfo:
+            await open_stream(db)
+        assert excinfo.value.status_code == 429
+        assert db.closed
+        await held.release.aclose()
+
+    asyncio.run(scenario())
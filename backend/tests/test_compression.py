@@ -0,0 +1,78 @@
+import gzip
+
+import pytest
+import zstandard
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.compression import CompressionMiddleware, decompress_body
+
+
+def zstd_frames(*parts: bytes) -> bytes:
+    compressor = zstandard.ZstdCompressor()
+    return b"".join(compressor.compress(part) for part in parts)
+
+
+@pytest.mark.parametrize(
+    "encoding, body",
+    [
+        ("zstd", zstd_frames(b"first frame,", b"second frame")),
+        ("gzip", gzip.compress(b"first frame,") + gzip.compress(b"second frame")),
+    ],
+)
+def test_every_frame_is_decoded(encoding, body):
+    assert decompress_body(encoding, body, 1024) == b"first frame,second frame"
+
+
+@pytest.mark.parametrize(
+    "encoding, body",
+    [
+        ("zstd", zstd_frames(b"x" * 1000)[:-4]),
+        ("zstd", zstd_frames(b"complete", b"y" * 1000)[:-4]),
+        ("gzip", gzip.compress(b"x" * 1000)[:-4]),
+    ],
+)
+def test_truncated_body_is_rejected(encoding, body):
+    with pytest.raises(ValueError):
+        decompress_body(encoding, body, 4096)
+
+
+@pytest.mark.parametrize(
+    "encoding, body",
+    [
+        ("zstd", zstd_frames(b"a" * 600, b"b" * 600)),
+        ("gzip", gzip.compress(b"a" * 600) + gzip.compress(b"b" * 600)),
+    ],
+)
+def test_limit_applies_across_frames(encoding, body):
+    with pytest.raises(OverflowError):
+        decompress_body(encoding, body, 1000)
+
+
+def test_zstd_bomb_stops_near_the_limit():
+    bomb = zstd_frames(b"\0" * (64 * 1024 * 1024))
+    with pytest.raises(OverflowError):
+        decompress_body("zstd", bomb, 1024 * 1024)
+
+
+def etagged_client() -> TestClient:
+    async def config(request):
+        return PlainTextResponse("x" * 4096, headers={"ETag": '"v1"'})
+
+    app = Starlette(routes=[Route("/config", config)])
+    return TestClient(CompressionMiddleware(app, minimum_size=1024))
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_compressed_response_gets_weak_etag(encoding):
+    response = etagged_client().get("/config", headers={"Accept-Encoding": encoding})
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["etag"] == 'W/"v1"'
+
+
+def test_identity_response_keeps_strong_etag():
+    response = etagged_client().get("/config", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import db
+
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def test_idle_pool_reports_no_overflow():
+    assert db.engine.pool.overflow() < 0
+    assert db.pool_status()["overflow"] == 0
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_only_waiting_for_a_returned_connection_is_timed(monkeypatch):
+    monkeypatch.setattr(db, "pool_stats", db.PoolStats())
+
+    async def scenario():
+        engine = create_async_engine(
+            TEST_DATABASE_URL, poolclass=db.MeteredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.2, pool_pre_ping=True
+        )
+        try:
+            async with engine.connect():
+                # A fresh connection is opened without queueing.
+                assert db.pool_stats.wait_seconds_total == 0.0
+                with pytest.raises(PoolTimeoutError):
+                    async with engine.connect():
+                        pass
+            async with engine.connect():
+                pass
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+    stats = db.pool_stats
+    assert (stats.checkouts, stats.checkout_timeouts) == (2, 1)
+    assert 0.2 <= stats.wait_seconds_max < 1
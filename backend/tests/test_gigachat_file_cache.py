@@ -0,0 +1,89 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import app.main as main
+from app.schemas import AiChatMessage, AiChatRequest
+
+
+IMAGE = base64.b64encode(b"\xff\xd8 not really a jpeg").decode("ascii")
+
+
+@pytest.fixture
+def gigachat(monkeypatch):
+    calls = {"uploads": 0, "completion_status": 200}
+
+    async def settings_row(db):
+        return main.AdminSettings(gigachat_auth_key="key", gigachat_scope="GIGACHAT_API_PERS")
+
+    async def access_token(settings_row):
+        return "token"
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/files"):
+            calls["uploads"] += 1
+            return httpx.Response(200, json={"id": f"file-{calls['uploads']}"})
+        if calls["completion_status"] != 200:
+            return httpx.Response(calls["completion_status"], text="file not found")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    monkeypatch.setattr(main.admin_settings_cache, "get", settings_row)
+    monkeypatch.setattr(main, "get_gigachat_access_token", access_token)
+    monkeypatch.setattr(main, "gigachat_http", httpx.AsyncClient(transport=httpx.MockTransport(upstream)))
+    monkeypatch.setattr(main, "gigachat_file_cache", main.GigachatFileCache(maxsize=8, ttl_seconds=60))
+    # A token cached for other credentials must not decide which account the file ids belong to.
+    monkeypatch.setattr(main, "gigachat_token_fingerprint", "someone-else")
+    return calls
+
+
+class RequestSession:
+    async def close(self) -> None:
+        pass
+
+
+def chat(image: str = IMAGE):
+    request = AiChatRequest(messages=[AiChatMessage(role="user", content="what is this")], image_base64=image)
+    return main.ai_chat(request, user=main.Principal(id=1), db=RequestSession())
+
+
+def test_cached_file_id_is_dropped_when_gigachat_rejects_it(gigachat):
+    async def scenario():
+        await chat()
+        await chat()
+        assert gigachat["uploads"] == 1
+
+        gigachat["completion_status"] = 400
+        with pytest.raises(HTTPException):
+            await chat()
+
+        gigachat["completion_status"] = 200
+        await chat()
+        assert gigachat["uploads"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_server_errors_keep_the_cached_file_id(gigachat):
+    async def scenario():
+        await chat()
+        gigachat["completion_status"] = 503
+        with pytest.raises(HTTPException):
+            await chat()
+        gigachat["completion_status"] = 200
+        await chat()
+        assert gigachat["uploads"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_file_ids_are_scoped_to_the_credentials_the_token_was_issued_for(gigachat):
+    async def scenario():
+        await chat()
+
+    asyncio.run(scenario())
+    settings_row = main.AdminSettings(gigachat_auth_key="key", gigachat_scope="GIGACHAT_API_PERS")
+    [(fingerprint, _)] = list(main.gigachat_file_cache._entries)
+    assert fingerprint == main.gigachat_settings_fingerprint(settings_row)
@@ -0,0 +1,48 @@
+import datetime as dt
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+
+MSGPACK = {"Accept": "application/msgpack"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    row = main.AdminSettings(
+        privacy_policy_text="Be nice.",
+        privacy_policy_updated_at=dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc),
+        updated_at=dt.datetime(2026, 1, 2, tzinfo=dt.timezone.utc),
+    )
+
+    async def settings_row(db):
+        return row
+
+    monkeypatch.setattr(main.admin_settings_cache, "get", settings_row)
+    return TestClient(main.app)
+
+
+def test_msgpack_and_json_get_distinct_etags(client):
+    as_json = client.get("/privacy_policy")
+    as_msgpack = client.get("/privacy_policy", headers=MSGPACK)
+    assert as_json.json()["text"] == "Be nice."
+    assert as_msgpack.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(as_msgpack.content)["text"] == "Be nice."
+    assert as_json.headers["etag"] != as_msgpack.headers["etag"]
+    assert "Accept" in as_msgpack.headers["vary"]
+
+
+def test_json_etag_does_not_revalidate_msgpack(client):
+    json_etag = client.get("/privacy_policy").headers["etag"]
+    response = client.get("/privacy_policy", headers={**MSGPACK, "If-None-Match": json_etag})
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content)["text"] == "Be nice."
+
+
+def test_matching_etag_revalidates_same_representation(client):
+    msgpack_etag = client.get("/privacy_policy", headers=MSGPACK).headers["etag"]
+    response = client.get("/privacy_policy", headers={**MSGPACK, "If-None-Match": msgpack_etag})
+    assert response.status_code == 304
@@ -0,0 +1,17 @@
+import asyncio
+
+from app.security import PasswordHasher
+
+
+def test_hashes_in_forkserver_workers():
+    hasher = PasswordHasher(workers=1, max_pending=4)
+
+    async def scenario():
+        password_hash = await hasher.hash("correct horse")
+        return await hasher.verify("correct horse", password_hash), await hasher.verify("wrong", password_hash)
+
+    try:
+        assert asyncio.run(scenario()) == (True, False)
+        assert hasher._executor._mp_context.get_start_method() == "forkserver"
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,200 @@
+"""EXPLAIN regression check for the hot per-user queries.
+
+Needs a disposable Postgres database in TEST_DATABASE_URL and is skipped without one.
+Schema and synthetic rows are created inside a transaction that is always rolled back.
+Each statement is built by the same helper the endpoint uses, and the test fails if
+its plan sequentially scans the table it reads.
+"""
+
+import asyncio
+import datetime as dt
+import json
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.main as main
+from app.db import Base
+from app.models import BookEntry, FoodEntry, StepEntry, SyncTombstone, TrainingEntry, WaterEntry, WeightEntry, XpEvent
+
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+SEED_USERS = 50
+SEED_DAYS = 365
+SEED_FIRST_DAY = 19000
+SEED_LOGIN_PREFIX = "plan-check-"
+QUERY_START = SEED_FIRST_DAY + SEED_DAYS // 2
+QUERY_END = QUERY_START + 6
+SINCE = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+CURSOR = main.encode_page_cursor(SINCE, 1_000_000)
+SYNC_CURSOR = main.SyncCursor(SINCE, xmin=1_000_000)
+
+SEED_STATEMENTS = [
+    """
+    INSERT INTO water_entries (user_id, date_epoch_day, amount_ml, created_at)
+    SELECT u.id, d, 250, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d CROSS JOIN generate_series(1, 3)
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO food_entries (user_id, date_epoch_day, title, calories, created_at)
+    SELECT u.id, d, 'meal', 500, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d CROSS JOIN generate_series(1, 3)
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO training_entries (user_id, date_epoch_day, title, calories_burned, duration_minutes, created_at)
+    SELECT u.id, d, 'run', 300, 30, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO xp_events (user_id, date_epoch_day, type, points, note, created_at)
+    SELECT u.id, d, 'check', 10, NULL, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO step_entries (user_id, date_epoch_day, steps, updated_at)
+    SELECT u.id, d, 8000, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO weight_entries (user_id, date_epoch_day, weight_kg, created_at, updated_at)
+    SELECT u.id, d, 70.0, now(), now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d
+    WHERE u.login LIKE :seed_logins
+    """,
+    """
+    INSERT INTO daily_summary (user_id, date_epoch_day, water_ml, kcal_in, kcal_burned, training_count, steps, weight_kg, updated_at)
+    SELECT u.id, d, 750, 1500, 300, 1, 8000, 70.0, now() FROM users u
+    CROSS JOIN generate_series(CAST(:first_day AS integer), CAST(:last_day AS integer)) d
+    WHERE u.login LIKE :seed_logins
+    """,
+]
+
+SEED_TABLES = [
+    "users",
+    "water_entries",
+    "food_entries",
+    "training_entries",
+    "xp_events",
+    "step_entries",
+    "weight_entries",
+    "daily_summary",
+]
+
+
+def hot_queries(user_id: int) -> dict[str, tuple[str, object]]:
+    """Statements issued by the endpoints, keyed by name, with the table that must not be seq-scanned."""
+    queries = {
+        "GET /water/me": ("water_entries", main.water_range_query(user_id, QUERY_START, QUERY_END)),
+        "GET /water/me page": ("water_entries", main.water_range_query(user_id, QUERY_START, QUERY_END, CURSOR, 50)),
+        "GET /food/me": ("food_entries", main.food_range_query(user_id, QUERY_START, QUERY_END)),
+        "GET /food/me page": ("food_entries", main.food_range_query(user_id, QUERY_START, QUERY_END, CURSOR, 50)),
+        "GET /training/me": ("training_entries", main.training_range_query(user_id, QUERY_START, QUERY_END)),
+        "GET /training/me page": (
+            "training_entries",
+            main.training_range_query(user_id, QUERY_START, QUERY_END, CURSOR, 50),
+        ),
+        "GET /xp/me/daily": ("xp_events", main.xp_daily_query(user_id, QUERY_START, QUERY_END)),
+        "GET /steps/me": ("step_entries", main.steps_range_query(user_id, QUERY_START, QUERY_END)),
+        "GET /weight/me": ("weight_entries", main.weight_range_query(user_id, QUERY_START, QUERY_END)),
+        "GET /summary/me": ("daily_summary", main.summary_range_query(user_id, QUERY_START, QUERY_END)),
+    }
+    for model, column in [
+        (StepEntry, StepEntry.updated_at),
+        (WaterEntry, WaterEntry.created_at),
+        (FoodEntry, FoodEntry.created_at),
+        (TrainingEntry, TrainingEntry.created_at),
+        (WeightEntry, WeightEntry.updated_at),
+        (BookEntry, BookEntry.updated_at),
+        (XpEvent, XpEvent.created_at),
+        (SyncTombstone, SyncTombstone.deleted_at),
+    ]:
+        queries[f"GET /sync/changes ({model.__tablename__})"] = (
+            model.__tablename__,
+            main.sync_changes_query(model, column, user_id, SYNC_CURSOR),
+        )
+    return queries
+
+
+def seq_scanned_tables(plan: dict) -> set[str]:
+    tables = set()
+    if plan.get("Node Type") == "Seq Scan":
+        tables.add(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        tables |= seq_scanned_tables(child)
+    return tables
+
+
+async def postgres_reachable() -> bool:
+    engine = create_async_engine(TEST_DATABASE_URL)
+    try:
+        async with engine.connect():
+            return True
+    except OperationalError:
+        return False
+    finally:
+        await engine.dispose()
+
+
+async def explain_hot_queries() -> dict[str, tuple[str, dict]]:
+    engine = create_async_engine(TEST_DATABASE_URL)
+    plans = {}
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                await conn.run_sync(Base.metadata.create_all)
+                user_ids = (
+                    await conn.execute(
+                        text(
+                            "INSERT INTO users (login, password_hash, created_at) "
+                            "SELECT :prefix || g, '!', now() FROM generate_series(1, CAST(:users AS integer)) g RETURNING id"
+                        ),
+                        {"prefix": SEED_LOGIN_PREFIX, "users": SEED_USERS},
+                    )
+                ).scalars().all()
+                params = {
+                    "first_day": SEED_FIRST_DAY,
+                    "last_day": SEED_FIRST_DAY + SEED_DAYS - 1,
+                    "seed_logins": f"{SEED_LOGIN_PREFIX}%",
+                }
+                for statement in SEED_STATEMENTS:
+                    await conn.execute(text(statement), params)
+                await conn.execute(text(f"ANALYZE {', '.join(SEED_TABLES)}"))
+
+                for name, (table, stmt) in hot_queries(min(user_ids)).items():
+                    sql = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+                    # exec_driver_sql: literal timestamps contain ":NN", which text() would read as binds.
+                    explained = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar_one()
+                    if isinstance(explained, str):
+                        explained = json.loads(explained)
+                    plans[name] = (table, explained[0]["Plan"])
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+    return plans
+
+
+@pytest.fixture(scope="module")
+def plans() -> dict[str, tuple[str, dict]]:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    if not asyncio.run(postgres_reachable()):
+        pytest.skip("Postgres at TEST_DATABASE_URL is unreachable")
+    return asyncio.run(explain_hot_queries())
+
+
+@pytest.mark.parametrize("name", list(hot_queries(0)))
+def test_hot_query_avoids_seq_scan(plans, name):
+    table, plan = plans[name]
+    assert table not in seq_scanned_tables(plan), f"{name}: sequential scan on {table}\n{json.dumps(plan, indent=2)}"
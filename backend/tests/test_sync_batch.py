@@ -0,0 +1,78 @@
+"""/sync/batch against a real Postgres in TEST_DATABASE_URL; skipped without one.
+
+Everything runs inside a transaction that is rolled back, the endpoint's commit only
+releasing a savepoint.
+"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import app.main as main
+from app.db import Base
+from app.models import SyncOperation, WaterEntry
+from app.schemas import SyncBatchItem, SyncBatchRequest
+
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+def water(amount_ml: int, op_id: str) -> SyncBatchItem:
+    return SyncBatchItem(
+        entity_type="water",
+        action="create",
+        payload={"date_epoch_day": 20000, "amount_ml": amount_ml},
+        client_op_id=op_id,
+    )
+
+
+async def run_batch(items: list[SyncBatchItem]):
+    engine = create_async_engine(TEST_DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            trans = await conn.begin()
+            try:
+                await conn.run_sync(Base.metadata.create_all)
+                user_id = (
+                    await conn.execute(
+                        text("INSERT INTO users (login, password_hash, created_at) VALUES ('sync-batch-test', '!', now()) RETURNING id")
+                    )
+                ).scalar_one()
+                async with AsyncSession(bind=conn, join_transaction_mode="create_savepoint") as db:
+                    result = await main.sync_batch(SyncBatchRequest(items=items), main.Principal(user_id), db)
+                    amounts = (
+                        await db.execute(select(WaterEntry.amount_ml).where(WaterEntry.user_id == user_id).order_by(WaterEntry.id))
+                    ).scalars().all()
+                    claimed = (
+                        await db.execute(select(func.count()).select_from(SyncOperation).where(SyncOperation.user_id == user_id))
+                    ).scalar_one()
+            finally:
+                await trans.rollback()
+    finally:
+        await engine.dispose()
+    return result, amounts, claimed
+
+
+def test_bad_row_fails_alone_instead_of_its_group():
+    # 2**31 does not fit the integer column, so the group's multi-row insert fails.
+    result, amounts, claimed = asyncio.run(run_batch([water(250, "a"), water(2**31, "b"), water(300, "c")]))
+    assert (result.processed, result.failed, result.replayed) == (2, 1, 0)
+    assert len(result.errors) == 1
+    assert result.failed_op_ids == ["b"]
+    assert amounts == [250, 300]
+    # The failed item's operation id is not kept, so the client can retry it.
+    assert claimed == 2
+
+
+def test_items_rejected_before_writing_report_their_op_ids():
+    unsupported = SyncBatchItem(entity_type="water", action="delete", payload={}, client_op_id="u")
+    malformed = SyncBatchItem(entity_type="water", action="create", payload={}, client_op_id="m")
+    result, amounts, _ = asyncio.run(run_batch([unsupported, water(250, "a"), malformed]))
+    assert (result.processed, result.failed) == (1, 2)
+    assert result.failed_op_ids == ["u", "m"]
+    assert amounts == [250]
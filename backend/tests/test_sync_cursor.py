@@ -0,0 +1,58 @@
+import asyncio
+import datetime as dt
+import os
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.main as main
+
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def test_cursor_round_trips_xmin_and_issue_time():
+    issued_at = main.now().replace(microsecond=0)
+    cursor = main.parse_sync_cursor(main.format_sync_cursor(123456, issued_at))
+    assert cursor == main.SyncCursor(issued_at, xmin=123456)
+
+
+def test_timestamp_cursor_is_still_accepted():
+    issued_at = main.now().replace(microsecond=0)
+    cursor = main.parse_sync_cursor(str(int(issued_at.timestamp() * 1000)))
+    assert cursor == main.SyncCursor(issued_at)
+
+
+def test_cursor_older_than_tombstone_retention_is_refused():
+    issued_at = main.now() - main.SYNC_CURSOR_TTL - dt.timedelta(minutes=1)
+    with pytest.raises(HTTPException) as exc:
+        main.parse_sync_cursor(main.format_sync_cursor(1, issued_at))
+    assert exc.value.status_code == 410
+    assert main.SYNC_TOMBSTONE_RETENTION > main.SYNC_CURSOR_TTL
+
+
+@pytest.mark.parametrize("cursor", ["x1", "xabc.1", "x1.2.3", "soon"])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        main.parse_sync_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_cursor_does_not_pass_a_writer_that_has_not_committed():
+    async def run():
+        engine = create_async_engine(TEST_DATABASE_URL)
+        try:
+            async with engine.connect() as writer, engine.connect() as reader:
+                await writer.begin()
+                writer_xid = (await writer.execute(text("SELECT pg_current_xact_id()::text::bigint"))).scalar_one()
+                xmin = (await reader.execute(main.SYNC_SNAPSHOT_XMIN)).scalar_one()
+                await writer.rollback()
+        finally:
+            await engine.dispose()
+        return writer_xid, xmin
+
+    writer_xid, xmin = asyncio.run(run())
+    assert xmin <= writer_xid